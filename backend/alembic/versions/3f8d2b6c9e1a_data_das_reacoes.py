@@ -0,0 +1,32 @@
+"""data das reações
+
+Revision ID: 3f8d2b6c9e1a
+Revises: 9c2e7f4a1b3d
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8d2b6c9e1a'
+down_revision: Union[str, Sequence[str], None] = '9c2e7f4a1b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('Reacoes') as batch_op:
+        batch_op.add_column(sa.Column('date_time', sa.DateTime(), nullable=True))
+    # a hora das reações antigas não foi guardada: contam como feitas na criação do post (como o ranking já as considerava)
+    op.execute('UPDATE "Reacoes" SET date_time = (SELECT p.date_time FROM "Postagens" p WHERE p.id_post = "Reacoes".id_post)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('Reacoes') as batch_op:
+        batch_op.drop_column('date_time')
@@ -0,0 +1,33 @@
+"""índices das consultas quentes
+
+Revision ID: 5d559ffb4672
+Revises: 6bb5d9306bd5
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d559ffb4672'
+down_revision: Union[str, Sequence[str], None] = '6bb5d9306bd5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_postagens_data', 'Postagens', ['date_time', 'id_post'], unique=False)
+    op.create_index('ix_postagens_usuario_data', 'Postagens', ['id_user', 'date_time', 'id_post'], unique=False)
+    op.create_index('ix_usuarios_email', 'Usuarios', ['email'], unique=False)
+    op.execute('ANALYZE') # atualizando as estatísticas usadas pelo planejador de consultas do SQLite
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_usuarios_email', table_name='Usuarios')
+    op.drop_index('ix_postagens_usuario_data', table_name='Postagens')
+    op.drop_index('ix_postagens_data', table_name='Postagens')
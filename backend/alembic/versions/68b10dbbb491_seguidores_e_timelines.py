@@ -0,0 +1,55 @@
+"""seguidores e timelines
+
+Revision ID: 68b10dbbb491
+Revises: a6ea3988d1ce
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '68b10dbbb491'
+down_revision: Union[str, Sequence[str], None] = 'a6ea3988d1ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('Seguidores',
+    sa.Column('id_seguidor', sa.Integer(), nullable=False),
+    sa.Column('id_seguido', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_seguido'], ['Usuarios.id_user'], ),
+    sa.ForeignKeyConstraint(['id_seguidor'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_seguidor', 'id_seguido')
+    )
+    op.create_index('ix_seguidores_seguido', 'Seguidores', ['id_seguido', 'id_seguidor'], unique=False)
+    op.create_table('Timelines',
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('id_post', sa.Integer(), nullable=False),
+    sa.Column('date_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['id_post'], ['Postagens.id_post'], ),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_user', 'id_post')
+    )
+    op.create_index('ix_timelines_user_data', 'Timelines', ['id_user', 'date_time', 'id_post'], unique=False)
+    op.create_index('ix_timelines_post', 'Timelines', ['id_post'], unique=False)
+    with op.batch_alter_table('Usuarios') as batch_op:
+        batch_op.add_column(sa.Column('seguidores', sa.Integer(), server_default='0', nullable=False))
+    # cada usuário vê os próprios posts no feed
+    op.execute('INSERT INTO "Timelines" (id_user, id_post, date_time) SELECT id_user, id_post, date_time FROM "Postagens" WHERE date_time IS NOT NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('Usuarios') as batch_op:
+        batch_op.drop_column('seguidores')
+    op.drop_index('ix_timelines_post', table_name='Timelines')
+    op.drop_index('ix_timelines_user_data', table_name='Timelines')
+    op.drop_table('Timelines')
+    op.drop_index('ix_seguidores_seguido', table_name='Seguidores')
+    op.drop_table('Seguidores')
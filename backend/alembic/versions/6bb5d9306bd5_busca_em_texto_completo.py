@@ -0,0 +1,54 @@
+"""busca em texto completo
+
+Revision ID: 6bb5d9306bd5
+Revises: 68b10dbbb491
+Create Date: 2026-10-18 10:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6bb5d9306bd5'
+down_revision: Union[str, Sequence[str], None] = '68b10dbbb491'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # índice FTS5 de conteúdo externo: guarda só o índice, o texto continua em Postagens
+    op.execute(
+        'CREATE VIRTUAL TABLE "Postagens_fts" USING fts5('
+        'text, content=\'Postagens\', content_rowid=\'id_post\', tokenize=\'unicode61 remove_diacritics 2\')'
+    )
+    # triggers que mantêm o índice igual a Postagens (UPDATE só quando o texto muda, likes/dislikes não mexem no índice)
+    op.execute(
+        'CREATE TRIGGER "Postagens_fts_ai" AFTER INSERT ON "Postagens" BEGIN '
+        'INSERT INTO "Postagens_fts" (rowid, text) VALUES (new.id_post, new.text); '
+        'END'
+    )
+    op.execute(
+        'CREATE TRIGGER "Postagens_fts_ad" AFTER DELETE ON "Postagens" BEGIN '
+        'INSERT INTO "Postagens_fts" ("Postagens_fts", rowid, text) VALUES (\'delete\', old.id_post, old.text); '
+        'END'
+    )
+    op.execute(
+        'CREATE TRIGGER "Postagens_fts_au" AFTER UPDATE OF text ON "Postagens" BEGIN '
+        'INSERT INTO "Postagens_fts" ("Postagens_fts", rowid, text) VALUES (\'delete\', old.id_post, old.text); '
+        'INSERT INTO "Postagens_fts" (rowid, text) VALUES (new.id_post, new.text); '
+        'END'
+    )
+    # preenchendo o índice com os posts que já existem
+    op.execute('INSERT INTO "Postagens_fts" ("Postagens_fts") VALUES (\'rebuild\')')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER IF EXISTS "Postagens_fts_au"')
+    op.execute('DROP TRIGGER IF EXISTS "Postagens_fts_ad"')
+    op.execute('DROP TRIGGER IF EXISTS "Postagens_fts_ai"')
+    op.execute('DROP TABLE IF EXISTS "Postagens_fts"')
@@ -0,0 +1,33 @@
+"""modo de fan-out guardado no usuário
+
+Revision ID: 9c2e7f4a1b3d
+Revises: 5d559ffb4672
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import os
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e7f4a1b3d'
+down_revision: Union[str, Sequence[str], None] = '5d559ffb4672'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('Usuarios') as batch_op:
+        batch_op.add_column(sa.Column('fanout_leitura', sa.Boolean(), server_default='0', nullable=False))
+    # quem já está no limiar teve os posts lidos no feed direto de Postagens (mesmo FANOUT_LIMIAR da API)
+    op.execute(sa.text('UPDATE "Usuarios" SET fanout_leitura = 1 WHERE seguidores >= :limiar').bindparams(limiar=int(os.getenv('FANOUT_LIMIAR', '5000'))))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('Usuarios') as batch_op:
+        batch_op.drop_column('fanout_leitura')
@@ -0,0 +1,64 @@
+"""tabela única de reações
+
+Revision ID: a6ea3988d1ce
+Revises: b3b6365db4ae
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6ea3988d1ce'
+down_revision: Union[str, Sequence[str], None] = 'b3b6365db4ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('Reacoes',
+    sa.Column('id_post', sa.Integer(), nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_post'], ['Postagens.id_post'], ),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_post', 'id_user')
+    )
+    # copiando as reações antigas (1 = like, -1 = dislike); se o usuário tiver as duas, o like vale
+    op.execute('INSERT INTO "Reacoes" (id_post, id_user, tipo) SELECT id_post, id_user, 1 FROM "Like_Posts"')
+    op.execute('INSERT OR IGNORE INTO "Reacoes" (id_post, id_user, tipo) SELECT id_post, id_user, -1 FROM "Dislike_Posts"')
+    # os contadores antigos podiam estar errados (a rota de dislike gravava em Like_Posts), então são recalculados
+    op.execute(
+        'UPDATE "Postagens" SET '
+        'likes = (SELECT count(*) FROM "Reacoes" r WHERE r.id_post = "Postagens".id_post AND r.tipo = 1), '
+        'dislikes = (SELECT count(*) FROM "Reacoes" r WHERE r.id_post = "Postagens".id_post AND r.tipo = -1)'
+    )
+    op.drop_table('Dislike_Posts')
+    op.drop_table('Like_Posts')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table('Like_Posts',
+    sa.Column('id_post', sa.Integer(), nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_post'], ['Postagens.id_post'], ),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_post', 'id_user'),
+    sa.UniqueConstraint('id_post', 'id_user', name='_user_post_uc')
+    )
+    op.create_table('Dislike_Posts',
+    sa.Column('id_post', sa.Integer(), nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_post'], ['Postagens.id_post'], ),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_post', 'id_user'),
+    sa.UniqueConstraint('id_post', 'id_user', name='_user_post_uc')
+    )
+    op.execute('INSERT INTO "Like_Posts" (id_post, id_user) SELECT id_post, id_user FROM "Reacoes" WHERE tipo = 1')
+    op.execute('INSERT INTO "Dislike_Posts" (id_post, id_user) SELECT id_post, id_user FROM "Reacoes" WHERE tipo = -1')
+    op.drop_table('Reacoes')
@@ -0,0 +1,67 @@
+"""criando tabelas
+
+Revision ID: b3b6365db4ae
+Revises: 
+Create Date: 2025-10-01 14:25:35.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3b6365db4ae'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('Usuarios',
+    sa.Column('id_user', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('password', sa.String(), nullable=False),
+    sa.Column('activity', sa.Boolean(), server_default='1', nullable=False),
+    sa.PrimaryKeyConstraint('id_user'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('Postagens',
+    sa.Column('id_post', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('user', sa.String(), nullable=False),
+    sa.Column('text', sa.String(), nullable=False),
+    sa.Column('date_time', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('likes', sa.Integer(), nullable=True),
+    sa.Column('dislikes', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.ForeignKeyConstraint(['user'], ['Usuarios.username'], ),
+    sa.PrimaryKeyConstraint('id_post')
+    )
+    op.create_table('Like_Posts',
+    sa.Column('id_post', sa.Integer(), nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_post'], ['Postagens.id_post'], ),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_post', 'id_user'),
+    sa.UniqueConstraint('id_post', 'id_user', name='_user_post_uc')
+    )
+    op.create_table('Dislike_Posts',
+    sa.Column('id_post', sa.Integer(), nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_post'], ['Postagens.id_post'], ),
+    sa.ForeignKeyConstraint(['id_user'], ['Usuarios.id_user'], ),
+    sa.PrimaryKeyConstraint('id_post', 'id_user'),
+    sa.UniqueConstraint('id_post', 'id_user', name='_user_post_uc')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('Dislike_Posts')
+    op.drop_table('Like_Posts')
+    op.drop_table('Postagens')
+    op.drop_table('Usuarios')
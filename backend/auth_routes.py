@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from models import Usuario, db
 from dependencies import pegar_sessao, verificar_token
-from main import bcrypt_context, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY
-from schemas import UsuarioSchema, LoginSchema
-from sqlalchemy.orm import Session
+from main import ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY
+from schemas import UsuarioSchema, LoginSchema, UsuarioAutenticado
+from senhas import pool_senhas
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordRequestForm
@@ -20,11 +22,11 @@ def creating_token(id_user):
 
 
 # Função para checar se a senha digitada condiz com a senha descriptografada do usuário
-def user_authentication(username, password, session):
-    user = session.query(Usuario).filter(Usuario.username==username).first() # pegando todos os usuários no banco
+async def user_authentication(username, password, session):
+    user = (await session.execute(select(Usuario).where(Usuario.username==username))).scalars().first() # pegando todos os usuários no banco
     if not user: # nome de usuário incorreto
         return False 
-    elif not bcrypt_context.verify(password, user.password): # senha incorreta
+    elif not await pool_senhas.verificar(password, user.password): # senha incorreta (conferida no pool do bcrypt, fora do event loop)
         return False
     return user # senha e usuário corretos
 
@@ -38,30 +40,30 @@ async def home(): # função assíncrona
 
 # Rota para criar uma conta (CREATE)
 @auth_router.post('/criar_conta')
-async def criar_conta(schema_user:UsuarioSchema, session: Session = Depends(pegar_sessao)):
-    user =  session.query(Usuario).filter(Usuario.username==schema_user.username).first() # verificando no banco se existe um usuário igual ao que está sendo cadastrado
+async def criar_conta(schema_user:UsuarioSchema, session: AsyncSession = Depends(pegar_sessao)):
+    user = (await session.execute(select(Usuario).where(Usuario.username==schema_user.username))).scalars().first() # verificando no banco se existe um usuário igual ao que está sendo cadastrado
     if user:
         # Já existe um usuário com esse nome
         raise HTTPException(status_code=400, detail='Já existe um usuário com esse nome')
     else:
         # Não existe um usuário com esse nome
-        exist_email = session.query(Usuario).filter(Usuario.email==schema_user.email).first() # verificando no banco se existe um email igual ao que está sendo cadastrado
+        exist_email = (await session.execute(select(Usuario).where(Usuario.email==schema_user.email))).scalars().first() # verificando no banco se existe um email igual ao que está sendo cadastrado
         if exist_email:
             # Email já cadastrado
             raise HTTPException(status_code=400, detail='E-mail já cadastrado')
         else:
             # Email não cadastrado
-            encrypted_password = bcrypt_context.hash(schema_user.password) # criptografando a senha
+            encrypted_password = await pool_senhas.gerar_hash(schema_user.password) # criptografando a senha no pool do bcrypt
             new_user = Usuario(schema_user.username, schema_user.email, encrypted_password, schema_user.activity) # dados do novo usuário
             session.add(new_user) # adicionando o usuário
-            session.commit() # commitando a mudança no banco de dados
+            await session.commit() # commitando a mudança no banco de dados
             return {'mensagem': f"Usuário cadastrado com sucesso!"}
         
 
 # Rota de login
 @auth_router.post('/login')
-async def login(login_schema: LoginSchema, session: Session = Depends(pegar_sessao)):
-    user = user_authentication(login_schema.username, login_schema.password, session) # parâmetros da função de autenticação (nome de usuário e senha) 
+async def login(login_schema: LoginSchema, session: AsyncSession = Depends(pegar_sessao)):
+    user = await user_authentication(login_schema.username, login_schema.password, session) # parâmetros da função de autenticação (nome de usuário e senha) 
     if not user: # usuário ou senha incorretos 
         raise HTTPException(status_code=400, detail='Usuário não encontrado ou credenciais inválidas')
     else:
@@ -75,8 +77,8 @@ async def login(login_schema: LoginSchema, session: Session = Depends(pegar_sess
     
 
 @auth_router.post('/login-form')
-async def login_form(dados_formulario: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(pegar_sessao)):
-    user = user_authentication(dados_formulario.username, dados_formulario.password, session) # parâmetros da função de login autenticado (nome de usuário e senha que foram preenchidos no formulário) 
+async def login_form(dados_formulario: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(pegar_sessao)):
+    user = await user_authentication(dados_formulario.username, dados_formulario.password, session) # parâmetros da função de login autenticado (nome de usuário e senha que foram preenchidos no formulário) 
     if not user: # usuário ou senha incorretos 
         raise HTTPException(status_code=400, detail='Usuário não encontrado ou credenciais inválidas')
     else:
@@ -91,7 +93,7 @@ async def login_form(dados_formulario: OAuth2PasswordRequestForm = Depends(), se
 
 # Função para usar o token
 @auth_router.get('/refresh')
-async def use_refresh_token(user: Usuario = Depends(verificar_token)): # o parâmetro deve ser um token válido
+async def use_refresh_token(user: UsuarioAutenticado = Depends(verificar_token)): # o parâmetro deve ser um token válido
     access_token = creating_token(user.id_user)
     return {
             'access_token': access_token,
@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+# Benchmark da API: cria um banco SQLite sintético (N usuários, M posts, seguidores e reações com distribuição de Zipf),
+# roda cargas de trabalho (login, feed, postagem, tempestade de likes e uma mistura delas) contra o app de main.py
+# e imprime em JSON a vazão e as latências p50/p95/p99 de cada rota, junto com o commit, para comparar entre versões.
+# uso: python benchmark.py [--usuarios 200] [--posts 5000] [--reacoes 20000] [--duracao 5] [--concorrencia 16]
+#                          [--cenarios feed,curtidas,...] [--uvicorn] [--semente 42] [--saida resultado.json]
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+SENHA = 'senha-benchmark' # a mesma senha (e o mesmo hash) para todos os usuários: o bcrypt só roda uma vez na criação do banco
+PALAVRAS = ['café', 'trilha', 'montanha', 'praia', 'cidade', 'livro', 'música', 'futebol', 'chuva', 'viagem', 'código', 'festa']
+
+# cenários: peso de cada operação no sorteio de cada requisição
+CENARIOS = {
+    'login': {'login': 1},
+    'feed': {'feed': 1},
+    'postagem': {'postar': 1},
+    'curtidas': {'curtir': 1},
+    'misto': {'feed': 45, 'listar': 10, 'buscar': 10, 'tendencias': 5, 'postar': 10, 'curtir': 18, 'login': 2},
+}
+
+argumentos = argparse.ArgumentParser(description='Benchmark da API com um banco sintético')
+argumentos.add_argument('--usuarios', type=int, default=200)
+argumentos.add_argument('--posts', type=int, default=5000)
+argumentos.add_argument('--seguindo', type=int, default=20, help='quantos usuários cada usuário segue')
+argumentos.add_argument('--reacoes', type=int, default=20000)
+argumentos.add_argument('--zipf', type=float, default=1.1, help='expoente da distribuição de popularidade dos posts e usuários')
+argumentos.add_argument('--limiar', type=int, default=None, help='FANOUT_LIMIAR usado pela API (padrão: o da API)')
+argumentos.add_argument('--cenarios', default=','.join(CENARIOS))
+argumentos.add_argument('--duracao', type=float, default=5.0, help='segundos de cada cenário')
+argumentos.add_argument('--concorrencia', type=int, default=16, help='clientes simultâneos')
+argumentos.add_argument('--uvicorn', action='store_true', help='roda também contra um uvicorn de verdade (HTTP local)')
+argumentos.add_argument('--porta', type=int, default=8765)
+argumentos.add_argument('--semente', type=int, default=42)
+argumentos.add_argument('--saida')
+opcoes = argumentos.parse_args()
+
+CAMINHO_BANCO = os.path.join(tempfile.mkdtemp(prefix='benchmark_'), 'benchmark.db')
+CAMINHO_COPIA = CAMINHO_BANCO.replace('.db', '_inicial.db') # banco recém-criado, restaurado antes de cada cenário
+os.environ['DATABASE_URL'] = f'sqlite:///{CAMINHO_BANCO}'
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('ALGORITHM', 'HS256')
+os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '60')
+if opcoes.limiar is not None:
+    os.environ['FANOUT_LIMIAR'] = str(opcoes.limiar)
+sys.path.insert(0, PASTA)
+
+import httpx # noqa: E402
+from alembic import command # noqa: E402
+from alembic.config import Config # noqa: E402
+from sqlalchemy import insert, text # noqa: E402
+
+from main import app, bcrypt_context # noqa: E402 (antes dos roteadores, que importam de main)
+from auth_routes import creating_token # noqa: E402
+from cache import cache_usuarios # noqa: E402
+from contadores import verificar_contadores # noqa: E402
+from models import Postagem, Reacao, Seguidor, Usuario, db # noqa: E402
+from senhas import pool_senhas # noqa: E402
+from timeline import DISTRIBUIR_POSTS, FANOUT_LIMIAR # noqa: E402
+
+
+# Função que devolve os pesos acumulados de uma distribuição de Zipf (posição 0 = mais popular), para o random.choices
+def pesos_zipf(quantidade, expoente):
+    acumulado, total = [], 0.0
+    for posicao in range(quantidade):
+        total += 1 / (posicao + 1) ** expoente
+        acumulado.append(total)
+    return acumulado
+
+
+# Função que copia um banco SQLite inteiro pela API de backup (consistente mesmo com o arquivo -wal)
+def copiar_banco(origem, destino):
+    fonte, alvo = sqlite3.connect(origem), sqlite3.connect(destino)
+    try:
+        fonte.backup(alvo)
+    finally:
+        fonte.close()
+        alvo.close()
+
+
+# Função que cria o banco sintético (migrations + dados) e devolve o que os clientes precisam saber dele
+def popular_banco(aleatorio):
+    command.upgrade(Config(os.path.join(PASTA, 'alembic.ini')), 'head')
+    hash_senha = bcrypt_context.hash(SENHA)
+    usuarios = [{'id_user': id_user, 'username': f'usuario{id_user}', 'email': f'usuario{id_user}@exemplo.com', 'password': hash_senha, 'activity': True}
+                for id_user in range(1, opcoes.usuarios + 1)]
+    ids_usuarios = [usuario['id_user'] for usuario in usuarios]
+    populares = aleatorio.sample(ids_usuarios, len(ids_usuarios)) # ordem de popularidade dos usuários
+    zipf_usuarios = pesos_zipf(len(populares), opcoes.zipf)
+
+    inicio = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) - timedelta(days=30)
+    datas = sorted(inicio + timedelta(seconds=aleatorio.randrange(30 * 24 * 3600)) for _ in range(opcoes.posts))
+    posts = []
+    for id_post, date_time in enumerate(datas, start=1):
+        id_user = aleatorio.choices(populares, cum_weights=zipf_usuarios)[0] # usuários populares também postam mais
+        posts.append({'id_post': id_post, 'id_user': id_user, 'user': f'usuario{id_user}', 'date_time': date_time, # coluna "user" da tabela
+                      'text': ' '.join(aleatorio.choices(PALAVRAS, k=aleatorio.randint(3, 12))), 'likes': 0, 'dislikes': 0})
+    ids_posts = [post['id_post'] for post in posts]
+    posts_populares = aleatorio.sample(ids_posts, len(ids_posts))
+
+    seguidores = set()
+    for id_user in ids_usuarios:
+        for id_seguido in aleatorio.choices(populares, cum_weights=zipf_usuarios, k=opcoes.seguindo):
+            if id_seguido != id_user:
+                seguidores.add((id_user, id_seguido))
+
+    reacoes = {}
+    for id_post in aleatorio.choices(posts_populares, cum_weights=pesos_zipf(len(posts_populares), opcoes.zipf), k=opcoes.reacoes):
+        reacoes[(id_post, aleatorio.choice(ids_usuarios))] = 1 if aleatorio.random() < 0.8 else -1
+
+    with db.begin() as conexao:
+        conexao.execute(insert(Usuario), usuarios)
+        conexao.execute(insert(Postagem.__table__), posts)
+        if seguidores:
+            conexao.execute(insert(Seguidor), [{'id_seguidor': id_seguidor, 'id_seguido': id_seguido} for id_seguidor, id_seguido in seguidores])
+        if reacoes:
+            conexao.execute(insert(Reacao), [{'id_post': id_post, 'id_user': id_user, 'tipo': tipo, 'date_time': posts[id_post - 1]['date_time']} for (id_post, id_user), tipo in reacoes.items()])
+        conexao.execute(text('UPDATE "Usuarios" SET seguidores = (SELECT count(*) FROM "Seguidores" s WHERE s.id_seguido = "Usuarios".id_user)'))
+        conexao.execute(text('UPDATE "Usuarios" SET fanout_leitura = seguidores >= :limiar'), {'limiar': FANOUT_LIMIAR})
+        conexao.execute(DISTRIBUIR_POSTS, {'ids': json.dumps(ids_posts)})
+        verificar_contadores(conexao, corrigir=True)
+        conexao.execute(text('ANALYZE'))
+    db.dispose()
+    copiar_banco(CAMINHO_BANCO, CAMINHO_COPIA)
+    return {
+        'usuarios': usuarios,
+        'tokens': {id_user: {'Authorization': f'Bearer {creating_token(id_user)}'} for id_user in ids_usuarios},
+        'posts_populares': posts_populares,
+        'zipf_posts': pesos_zipf(len(posts_populares), opcoes.zipf),
+    }
+
+
+# Medições de um cenário: latências e status de cada rota (rota = método + caminho com os parâmetros como no order_routes)
+class Medicoes:
+    def __init__(self):
+        self.latencias = {}
+        self.status = {}
+
+    def registrar(self, rota, duracao, status):
+        self.latencias.setdefault(rota, []).append(duracao)
+        contagem = self.status.setdefault(rota, {})
+        contagem[status] = contagem.get(status, 0) + 1
+
+    # Função que resume as medições: vazão e percentis (ms) por rota e no total
+    def resumo(self, duracao):
+        def percentis(valores):
+            ordenados = sorted(valores)
+
+            def posicao(fracao):
+                return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+            return {
+                'requisicoes': len(ordenados),
+                'rps': round(len(ordenados) / duracao, 1),
+                'media_ms': round(1000 * sum(ordenados) / len(ordenados), 2),
+                'p50_ms': round(1000 * posicao(0.50), 2),
+                'p95_ms': round(1000 * posicao(0.95), 2),
+                'p99_ms': round(1000 * posicao(0.99), 2),
+                'max_ms': round(1000 * ordenados[-1], 2),
+            }
+        rotas = {rota: {**percentis(valores), 'status': self.status[rota]} for rota, valores in sorted(self.latencias.items())}
+        todas = [valor for valores in self.latencias.values() for valor in valores]
+        erros = sum(quantidade for contagem in self.status.values() for status, quantidade in contagem.items() if status == 'erro' or status >= 500)
+        return {'duracao_s': round(duracao, 2), 'total': percentis(todas) if todas else {}, 'erros': erros, 'rotas': rotas}
+
+
+# Cliente simulado: sorteia as operações do cenário e mede cada requisição
+class Cliente:
+    def __init__(self, http, dados, medicoes, aleatorio):
+        self.http = http
+        self.dados = dados
+        self.medicoes = medicoes
+        self.aleatorio = aleatorio
+
+    async def medir(self, rota, metodo, caminho, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            resposta = await self.http.request(metodo, caminho, **kwargs)
+            status = resposta.status_code
+        except httpx.HTTPError:
+            resposta, status = None, 'erro'
+        self.medicoes.registrar(rota, time.perf_counter() - inicio, status)
+        return resposta
+
+    def usuario(self):
+        return self.aleatorio.choice(self.dados['usuarios'])
+
+    def post_popular(self):
+        return self.aleatorio.choices(self.dados['posts_populares'], cum_weights=self.dados['zipf_posts'])[0]
+
+    async def login(self):
+        await self.medir('POST /auth/login', 'POST', '/auth/login', json={'username': self.usuario()['username'], 'password': SENHA})
+
+    async def feed(self):
+        headers = self.dados['tokens'][self.usuario()['id_user']]
+        resposta = await self.medir('GET /order/feed', 'GET', '/order/feed', params={'limit': 20}, headers=headers)
+        if resposta is not None and resposta.status_code == 200 and resposta.json()['next_cursor'] and self.aleatorio.random() < 0.3: # parte dos usuários rola para a segunda página
+            await self.medir('GET /order/feed (cursor)', 'GET', '/order/feed', params={'limit': 20, 'cursor': resposta.json()['next_cursor']}, headers=headers)
+
+    async def listar(self):
+        await self.medir('GET /order/listar_posts', 'GET', '/order/listar_posts', params={'limit': 20}, headers=self.dados['tokens'][self.usuario()['id_user']])
+
+    async def buscar(self):
+        await self.medir('GET /order/buscar', 'GET', '/order/buscar', params={'q': self.aleatorio.choice(PALAVRAS), 'limit': 20}, headers=self.dados['tokens'][self.usuario()['id_user']])
+
+    async def tendencias(self):
+        await self.medir('GET /order/trending', 'GET', '/order/trending', params={'limit': 20}, headers=self.dados['tokens'][self.usuario()['id_user']])
+
+    async def postar(self):
+        usuario = self.usuario()
+        corpo = {'id_user': usuario['id_user'], 'username': usuario['username'], 'text': ' '.join(self.aleatorio.choices(PALAVRAS, k=8))}
+        await self.medir('POST /order/postar', 'POST', '/order/postar', json=corpo, headers=self.dados['tokens'][usuario['id_user']])
+
+    async def curtir(self):
+        await self.medir('POST /order/like_post/{id_post}', 'POST', f'/order/like_post/{self.post_popular()}', headers=self.dados['tokens'][self.usuario()['id_user']])
+
+    async def rodar(self, pesos, fim):
+        operacoes, acumulado = list(pesos), []
+        for operacao in operacoes:
+            acumulado.append((acumulado[-1] if acumulado else 0) + pesos[operacao])
+        while time.perf_counter() < fim:
+            await getattr(self, self.aleatorio.choices(operacoes, cum_weights=acumulado)[0])()
+
+
+# Função que roda cada cenário com `concorrencia` clientes simultâneos por `duracao` segundos. Cada cenário começa
+# do banco recém-criado e com a API subida de novo (`servidor` abre a API e devolve o cliente HTTP): sem isso os posts,
+# curtidas e contadores de um cenário mudariam o feed, as tendências e o tamanho das tabelas do seguinte
+async def rodar_cenarios(servidor, dados):
+    resultados = {}
+    for numero, nome in enumerate(opcoes.cenarios.split(',')):
+        copiar_banco(CAMINHO_COPIA, CAMINHO_BANCO)
+        cache_usuarios.limpar()
+        async with servidor() as http:
+            medicoes = Medicoes()
+            clientes = [Cliente(http, dados, medicoes, random.Random(opcoes.semente * 1000 + numero * 100 + indice)) for indice in range(opcoes.concorrencia)]
+            inicio = time.perf_counter()
+            await asyncio.gather(*(cliente.rodar(CENARIOS[nome], inicio + opcoes.duracao) for cliente in clientes))
+            resultados[nome] = medicoes.resumo(time.perf_counter() - inicio)
+    return resultados
+
+
+# Função que abre a API dentro do processo (ASGI direto, sem rede), com a subida e a parada dela
+@asynccontextmanager
+async def servidor_asgi():
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark', timeout=60) as http:
+            yield http
+
+
+# Função que roda os cenários dentro do processo (ASGI direto, sem rede)
+async def rodar_asgi(dados):
+    resultados = await rodar_cenarios(servidor_asgi, dados)
+    resultados['servidor'] = {'bcrypt': pool_senhas.estatisticas(), 'cache_usuarios': cache_usuarios.estatisticas()}
+    return resultados
+
+
+# Função que sobe um uvicorn com o mesmo banco e devolve o cliente HTTP dele
+@asynccontextmanager
+async def servidor_uvicorn():
+    servidor = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(opcoes.porta), '--log-level', 'warning'],
+        cwd=PASTA, env=os.environ.copy(),
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{opcoes.porta}', timeout=60, limits=httpx.Limits(max_connections=opcoes.concorrencia)) as http:
+            for _ in range(100): # esperando o servidor aceitar conexões
+                try:
+                    await http.get('/auth/')
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError('O uvicorn não subiu')
+            yield http
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=30)
+
+
+# Função que roda os cenários contra um uvicorn de verdade (HTTP local)
+async def rodar_uvicorn(dados):
+    return await rodar_cenarios(servidor_uvicorn, dados)
+
+
+# Função que identifica a versão medida (commit e se havia mudanças ainda não commitadas)
+def versao():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PASTA, capture_output=True, text=True, check=True).stdout.strip()
+        alterado = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PASTA, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'alterado': None}
+    return {'commit': commit, 'alterado': alterado}
+
+
+def main():
+    for nome in opcoes.cenarios.split(','):
+        if nome not in CENARIOS:
+            argumentos.error(f'cenário desconhecido: {nome} (opções: {", ".join(CENARIOS)})')
+    aleatorio = random.Random(opcoes.semente)
+    inicio = time.perf_counter()
+    dados = popular_banco(aleatorio)
+    resultado = {
+        **versao(),
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'ambiente': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'cpus': os.cpu_count(), 'sistema': platform.platform()},
+        'parametros': {**vars(opcoes), 'fanout_limiar': FANOUT_LIMIAR},
+        'criacao_banco_s': round(time.perf_counter() - inicio, 2),
+        'asgi': asyncio.run(rodar_asgi(dados)),
+    }
+    if opcoes.uvicorn:
+        resultado['uvicorn'] = asyncio.run(rodar_uvicorn(dados))
+    saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if opcoes.saida:
+        with open(opcoes.saida, 'w') as arquivo:
+            arquivo.write(saida + '\n')
+    print(saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from fastapi import HTTPException
+from sqlalchemy import text
+
+# busca em texto completo: a tabela virtual FTS5 "Postagens_fts" espelha a coluna text de Postagens
+# (mantida por triggers criados na migration, então qualquer INSERT/UPDATE/DELETE em Postagens já atualiza o índice)
+# bm25 menor = mais relevante; a página seguinte continua depois do par (score, id_post) do último resultado
+BUSCAR_POSTS = '''
+    SELECT id_post, score FROM (
+        SELECT f.rowid AS id_post, bm25("Postagens_fts") AS score
+        FROM "Postagens_fts" f
+        {juntar_autor}
+        WHERE "Postagens_fts" MATCH :consulta {filtrar_autor}
+    )
+    {depois_do_cursor}
+    ORDER BY score, id_post
+    LIMIT :limite
+'''
+
+
+# Função que transforma o texto digitado pelo usuário em uma consulta FTS5 segura:
+# cada palavra vira uma frase entre aspas (todas precisam aparecer), então operadores e aspas soltas não quebram a busca
+def montar_consulta(termos):
+    palavras = termos.split()
+    if not palavras:
+        raise HTTPException(status_code=400, detail='Digite algum termo para buscar')
+    return ' '.join('"' + palavra.replace('"', '""') + '"' for palavra in palavras)
+
+
+# Função que busca os posts pelo texto, ordenados por relevância; devolve [(id_post, score)] com um a mais para saber se existe próxima página
+async def buscar_posts(session, termos, limit, autor=None, posicao=None):
+    parametros = {'consulta': montar_consulta(termos), 'limite': limit + 1}
+    sql = BUSCAR_POSTS.format(
+        juntar_autor='JOIN "Postagens" p ON p.id_post = f.rowid' if autor is not None else '',
+        filtrar_autor='AND p.id_user = :autor' if autor is not None else '',
+        depois_do_cursor='WHERE (score, id_post) > (:score, :id_post)' if posicao else '',
+    )
+    if autor is not None:
+        parametros['autor'] = autor
+    if posicao:
+        parametros['score'], parametros['id_post'] = posicao
+    return [tuple(linha) for linha in await session.execute(text(sql), parametros)]
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import Usuario
+import os
+import threading
+import time
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60')) # segundos que um usuário verificado fica guardado
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000')) # quantidade máxima de usuários guardados
+
+
+# Cache em memória dos usuários já verificados (LRU com tempo de expiração), chaveado pelo ID do usuário
+# evita uma ida ao banco em toda requisição autenticada só para recarregar a mesma linha de Usuarios
+class CacheUsuarios:
+    def __init__(self, tamanho_maximo, ttl):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._itens = OrderedDict() # id_user -> (momento de expiração, usuário)
+        self._lock = threading.Lock() # os eventos do SQLAlchemy podem vir de outras threads (scripts, alembic)
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.removidos = 0 # retirados por falta de espaço
+
+    # Função para buscar um usuário no cache (None quando não está ou já expirou)
+    def pegar(self, id_user):
+        with self._lock:
+            item = self._itens.get(id_user)
+            if item is None:
+                self.misses += 1
+                return None
+            expira_em, usuario = item
+            if expira_em < time.monotonic():
+                del self._itens[id_user]
+                self.expirados += 1
+                self.misses += 1
+                return None
+            self._itens.move_to_end(id_user) # marcando como usado recentemente
+            self.hits += 1
+            return usuario
+
+    # Função para guardar um usuário no cache, retirando o menos usado se passar do limite
+    def guardar(self, id_user, usuario):
+        if self.tamanho_maximo <= 0:
+            return
+        with self._lock:
+            self._itens[id_user] = (time.monotonic() + self.ttl, usuario)
+            self._itens.move_to_end(id_user)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+                self.removidos += 1
+
+    # Função para tirar um usuário do cache (conta alterada, desativada ou deletada)
+    def invalidar(self, id_user):
+        with self._lock:
+            self._itens.pop(id_user, None)
+
+    # Função para esvaziar o cache inteiro
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    # Função que devolve os contadores do cache, usados para dimensionar o tamanho e o TTL
+    def estatisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'tamanho': len(self._itens),
+                'tamanho_maximo': self.tamanho_maximo,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirados': self.expirados,
+                'removidos': self.removidos,
+                'taxa_acerto': self.hits / total if total else 0.0,
+            }
+
+
+cache_usuarios = CacheUsuarios(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+# Sempre que um usuário for alterado (ex: Usuario.activity) ou deletado pelo ORM, ele sai do cache. Os eventos do mapper rodam
+# no flush, antes do commit: nesse intervalo outra requisição ainda lê a linha antiga no banco e pode guardá-la de novo,
+# então o ID também fica anotado na sessão e é invalidado outra vez depois do commit
+@event.listens_for(Usuario, 'after_update')
+@event.listens_for(Usuario, 'after_delete')
+def invalidar_usuario_alterado(mapper, conexao, usuario):
+    cache_usuarios.invalidar(usuario.id_user)
+    sessao = object_session(usuario)
+    if sessao is not None:
+        sessao.info.setdefault('usuarios_alterados', set()).add(usuario.id_user)
+
+
+# UPDATE/DELETE em massa (update(Usuario)...) não passam pelos eventos acima e não dizem quais linhas mudaram,
+# então o cache é esvaziado por completo (agora e de novo depois do commit)
+@event.listens_for(Session, 'do_orm_execute')
+def invalidar_alteracao_em_massa(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is Usuario.__mapper__:
+        cache_usuarios.limpar()
+        orm_execute_state.session.info['usuarios_limpar'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidar_depois_do_commit(sessao):
+    if sessao.info.pop('usuarios_limpar', False):
+        cache_usuarios.limpar()
+    for id_user in sessao.info.pop('usuarios_alterados', ()):
+        cache_usuarios.invalidar(id_user)
+
+
+@event.listens_for(Session, 'after_rollback')
+def descartar_alteracoes(sessao): # nada mudou no banco
+    sessao.info.pop('usuarios_limpar', None)
+    sessao.info.pop('usuarios_alterados', None)
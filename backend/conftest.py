@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Configuração comum dos testes: todos usam o mesmo banco temporário (com todas as migrations), nunca o banco.db.
+# As variáveis de ambiente têm que estar definidas antes de qualquer import de models.py, que cria os engines.
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_BANCO = os.path.join(tempfile.mkdtemp(prefix='testes_'), 'testes.db')
+
+os.environ['DATABASE_URL'] = f'sqlite:///{CAMINHO_BANCO}'
+os.environ.setdefault('SECRET_KEY', 'verificacao-de-testes')
+os.environ.setdefault('ALGORITHM', 'HS256')
+os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '30')
+os.environ.setdefault('EXPORTACAO_USUARIOS', '1')
+os.environ.setdefault('INGESTAO_USUARIOS', '2')
+sys.path.insert(0, PASTA)
+
+
+# Fixture que cria as tabelas no banco temporário e devolve o caminho dele
+@pytest.fixture(scope='session')
+def banco():
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config(os.path.join(PASTA, 'alembic.ini')), 'head')
+    return CAMINHO_BANCO
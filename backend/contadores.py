@@ -0,0 +1,213 @@
+from sqlalchemy import bindparam, func, select, text, update
+from models import Postagem, SessaoAsync, db
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import sys
+
+CONTADORES_INTERVALO = float(os.getenv('CONTADORES_INTERVALO', '1.0')) # segundos entre cada gravação dos contadores no banco
+CONTADORES_LIMITE = int(os.getenv('CONTADORES_LIMITE', '500')) # quantidade de posts pendentes que antecipa a gravação
+CONTADORES_USUARIOS = {int(id_user) for id_user in os.getenv('CONTADORES_USUARIOS', '').split(',') if id_user.strip()} # IDs que podem reconstruir os contadores pela rota
+
+logger = logging.getLogger(__name__)
+
+tabela_posts = Postagem.__table__
+
+# UPDATE usado na gravação em lote (executemany): soma as diferenças acumuladas em cada post
+atualizar_contadores = (
+    update(tabela_posts)
+    .where(tabela_posts.c.id_post == bindparam('b_id_post'))
+    .values(
+        likes=func.coalesce(tabela_posts.c.likes, 0) + bindparam('b_likes'),
+        dislikes=func.coalesce(tabela_posts.c.dislikes, 0) + bindparam('b_dislikes'),
+    )
+)
+
+# contagem real a partir das linhas de Reacoes, usada na verificação de consistência
+CONTAGEM_REAL = (
+    '(SELECT count(*) FROM "Reacoes" r WHERE r.id_post = "Postagens".id_post AND r.tipo = 1)',
+    '(SELECT count(*) FROM "Reacoes" r WHERE r.id_post = "Postagens".id_post AND r.tipo = -1)',
+)
+
+
+# Agregador dos contadores de likes/dislikes (write-behind): em vez de um UPDATE na mesma linha do post
+# a cada clique (o que serializa todas as escritas no lock do SQLite), as diferenças ficam em memória e
+# são gravadas em lote a cada intervalo ou quando muitos posts estão pendentes
+class AgregadorContadores:
+    def __init__(self, intervalo, limite):
+        self.intervalo = intervalo
+        self.limite = limite
+        self.pendentes = {} # id_post -> [likes, dislikes] ainda não gravados
+        self.em_voo = {} # diferenças que estão sendo gravadas agora (continuam valendo para as leituras até o commit)
+        self.versao = 0 # ímpar enquanto um commit está em andamento; muda a cada commit (ver executar)
+        self.gravacoes = 0 # quantidade de lotes gravados
+        self._lock = asyncio.Lock() # uma gravação por vez
+        self._acordar = asyncio.Event()
+        self._tarefa = None
+        self._reacoes = 0 # reações entre o começo da transação e o registrar (ver escrita)
+        self._sem_reacoes = asyncio.Event()
+        self._liberado = asyncio.Event() # fechado enquanto uma reconstrução espera ou roda
+        self._sem_reacoes.set()
+        self._liberado.set()
+
+    # Contexto em volta de toda a transação de uma reação até o registrar: entre o commit e o registrar a reação já está
+    # no banco mas a diferença ainda não está em pendentes, então a reconstrução espera essas reações terminarem e
+    # segura as novas até acabar (senão ela contaria a reação e o registrar somaria de novo)
+    @asynccontextmanager
+    async def escrita(self):
+        await self._liberado.wait()
+        self._reacoes += 1
+        self._sem_reacoes.clear()
+        try:
+            yield
+        finally:
+            self._reacoes -= 1
+            if not self._reacoes:
+                self._sem_reacoes.set()
+
+    # Função para registrar a mudança de um post (chamada logo depois do commit da reação)
+    def registrar(self, id_post, likes, dislikes):
+        if not likes and not dislikes:
+            return
+        diferenca = self.pendentes.setdefault(id_post, [0, 0])
+        diferenca[0] += likes
+        diferenca[1] += dislikes
+        if len(self.pendentes) >= self.limite: # muitos posts pendentes: grava antes do intervalo
+            self._acordar.set()
+
+    # Função que devolve as diferenças ainda não gravadas de um post
+    def pendente(self, id_post):
+        likes = dislikes = 0
+        for diferencas in (self.em_voo, self.pendentes):
+            if id_post in diferencas:
+                likes += diferencas[id_post][0]
+                dislikes += diferencas[id_post][1]
+        return likes, dislikes
+
+    # Função que soma as diferenças pendentes num post já lido do banco (dicionário), para o cliente ver a contagem atual
+    def mesclar(self, post):
+        likes, dislikes = self.pendente(post['id_post'])
+        if likes or dislikes:
+            post['likes'] = (post['likes'] or 0) + likes
+            post['dislikes'] = (post['dislikes'] or 0) + dislikes
+        return post
+
+    # Função que roda uma consulta que lê os contadores de Postagens para em seguida passar pelo mesclar (sem await no meio).
+    # Se um commit da gravação aconteceu durante a consulta, não dá para saber se a leitura já viu as diferenças em voo
+    # (seriam contadas duas vezes ou nenhuma), então a consulta é refeita; sem commit no meio, banco e em_voo batem
+    async def executar(self, session, consulta):
+        while True:
+            versao = self.versao
+            resultado = await session.execute(consulta)
+            if versao % 2 == 0 and versao == self.versao:
+                return resultado
+
+    # Função que lê os contadores atuais de vários posts (banco + diferenças pendentes) em uma consulta
+    async def ler_contadores(self, session, ids_posts):
+        linhas = await self.executar(session, select(Postagem.id_post, Postagem.likes, Postagem.dislikes).where(Postagem.id_post.in_(ids_posts)))
+        return [self.mesclar(dict(linha._mapping)) for linha in linhas]
+
+    # Função que grava todas as diferenças pendentes em uma única transação
+    async def descarregar(self):
+        async with self._lock:
+            return await self._descarregar()
+
+    async def _descarregar(self): # chamada com o lock
+        if not self.pendentes:
+            return 0
+        self.em_voo, self.pendentes = self.pendentes, {}
+        parametros = [{'b_id_post': id_post, 'b_likes': likes, 'b_dislikes': dislikes} for id_post, (likes, dislikes) in self.em_voo.items()]
+        try:
+            async with SessaoAsync() as session:
+                await session.execute(atualizar_contadores, parametros)
+                self.versao += 1 # commit em andamento
+                try:
+                    await session.commit()
+                finally:
+                    self.versao += 1
+                self.em_voo = {} # já gravadas: a partir daqui as leituras pegam essas diferenças do banco
+            self.gravacoes += 1
+        except BaseException: # inclusive cancelamento na parada da API
+            for id_post, (likes, dislikes) in self.em_voo.items(): # devolvendo as diferenças para a próxima tentativa
+                self.registrar(id_post, likes, dislikes)
+            self.em_voo = {}
+            raise
+        return len(parametros)
+
+    # Função que reconstrói os contadores a partir das linhas de Reacoes com a API rodando. Com o lock, grava antes as
+    # diferenças pendentes e roda o UPDATE na mesma seção: pendentes e em_voo ficam vazios, então nada do que a
+    # reconstrução já contou é somado de novo numa gravação posterior. Devolve quantos posts foram corrigidos
+    async def reconstruir(self):
+        self._liberado.clear()
+        try:
+            await self._sem_reacoes.wait()
+            async with self._lock:
+                await self._descarregar()
+                async with SessaoAsync() as session:
+                    corrigidos = await session.run_sync(lambda sessao: verificar_contadores(sessao.connection(), corrigir=True))
+                    await session.commit()
+                return corrigidos
+        finally:
+            self._liberado.set()
+
+    async def _rodar(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+            try:
+                await self.descarregar()
+            except Exception:
+                logger.exception('Erro ao gravar os contadores dos posts, tentando de novo no próximo intervalo')
+
+    # Função chamada na subida da API
+    def iniciar(self):
+        self._lock = asyncio.Lock() # criados de novo para ficarem no event loop atual
+        self._acordar = asyncio.Event()
+        self._sem_reacoes = asyncio.Event()
+        self._liberado = asyncio.Event()
+        self._sem_reacoes.set()
+        self._liberado.set()
+        self._tarefa = asyncio.create_task(self._rodar())
+
+    # Função chamada na parada da API: para a tarefa e grava o que ainda estiver pendente
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self.descarregar()
+
+
+agregador = AgregadorContadores(CONTADORES_INTERVALO, CONTADORES_LIMITE)
+
+
+# Função que compara os contadores de Postagens com as linhas de Reacoes e, se pedido, reconstrói os que estiverem errados
+# (com a API rodando, diferenças que ainda estão na memória do agregador aparecem aqui até a próxima gravação; por isso
+# a correção com a API no ar é feita só pelo agregador.reconstruir, pela rota /order/reconstruir_contadores)
+def verificar_contadores(conexao, corrigir=False):
+    likes, dislikes = CONTAGEM_REAL
+    divergentes = f'coalesce(likes, 0) != {likes} OR coalesce(dislikes, 0) != {dislikes}'
+    if corrigir:
+        resultado = conexao.execute(text(f'UPDATE "Postagens" SET likes = {likes}, dislikes = {dislikes} WHERE {divergentes}'))
+        return resultado.rowcount
+    return conexao.execute(text(f'SELECT count(*) FROM "Postagens" WHERE {divergentes}')).scalar()
+
+
+# uso: python contadores.py [--corrigir --api-parada]
+# (a correção por aqui não enxerga as diferenças na memória da API, que seriam somadas de novo na próxima gravação:
+# com a API rodando, use a rota /order/reconstruir_contadores)
+if __name__ == '__main__':
+    corrigir = '--corrigir' in sys.argv
+    if corrigir and '--api-parada' not in sys.argv:
+        sys.exit('Recusado: a correção pela linha de comando só pode rodar com a API parada (confirme com --api-parada) '
+                 'ou use a rota /order/reconstruir_contadores com a API rodando')
+    with db.begin() as conexao:
+        quantidade = verificar_contadores(conexao, corrigir)
+    print(f'{quantidade} post(s) com contadores {"corrigidos" if corrigir else "divergentes"}')
@@ -1,28 +1,32 @@
 from fastapi import Depends, HTTPException
 from main import SECRET_KEY, ALGORITHM, oauth2_schema
-from models import db
-from sqlalchemy.orm import sessionmaker, Session
+from models import SessaoAsync
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Usuario
+from schemas import UsuarioAutenticado
+from cache import cache_usuarios
 from jose import jwt, JWTError
 
 # Função que permite que uma sessão seja criada e fechada 
-def pegar_sessao():
-    try:
-        Session = sessionmaker(bind=db)
-        session = Session()
+async def pegar_sessao():
+    async with SessaoAsync() as session: # faz com que a sessão seja fechada independente do que aconteça
         yield session
-    finally: # faz com que a sessão seja fechada independente do que aconteça
-        session.close()
 
 
 # Função para validar o token
-def verificar_token(token: str = Depends(oauth2_schema), session: Session = Depends(pegar_sessao)): 
+async def verificar_token(token: str = Depends(oauth2_schema), session: AsyncSession = Depends(pegar_sessao)): 
     try:     
         dic_info = jwt.decode(token, SECRET_KEY, ALGORITHM) # decodificando o token utilizando a SECRET_KEY e o ALGORITHM
         id_user = int(dic_info.get('sub')) # ID do usuário que foi pego no dicionário de informações
     except JWTError: 
         raise HTTPException(status_code=401, detail='Acesso negado, verifique a validade do token') # erro de token inválido
-    user = session.query(Usuario).filter(Usuario.id_user==id_user).first() # procurando o ID no banco
+    user = cache_usuarios.pegar(id_user) # procurando o usuário no cache antes de ir ao banco
+    if user:
+        return user
+    user = (await session.execute(select(Usuario).where(Usuario.id_user==id_user))).scalars().first() # procurando o ID no banco
     if not user:
         raise HTTPException(status_code=401, detail='Acesso inválido') # erro de nome de usuário incorreto
-    return user
\ No newline at end of file
+    user = UsuarioAutenticado.model_validate(user) # guardando só os dados públicos, a senha não entra no cache
+    cache_usuarios.guardar(id_user, user)
+    return user
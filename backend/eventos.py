@@ -0,0 +1,174 @@
+from fastapi import HTTPException
+from sqlalchemy import select
+from collections import deque
+from models import Postagem, Seguidor, SessaoAsync
+from schemas import PostResposta
+from contadores import agregador
+import asyncio
+import logging
+import orjson
+import os
+
+EVENTOS_INTERVALO = float(os.getenv('EVENTOS_INTERVALO', '1.0')) # segundos entre cada envio dos contadores alterados (no máximo uma mensagem por post)
+EVENTOS_FILA = int(os.getenv('EVENTOS_FILA', '100')) # eventos guardados por cliente; acima disso os mais antigos são descartados
+EVENTOS_MAX_ASSINANTES = int(os.getenv('EVENTOS_MAX_ASSINANTES', '1000')) # conexões abertas ao mesmo tempo neste processo
+EVENTOS_PING = float(os.getenv('EVENTOS_PING', '15')) # segundos sem eventos até mandar um comentário para manter a conexão
+
+logger = logging.getLogger(__name__)
+
+colunas_post = [getattr(Postagem, campo) for campo in PostResposta.model_fields]
+
+
+# Cliente conectado no canal de eventos. Os eventos ficam numa fila limitada (cliente lento perde os mais antigos e recebe
+# um aviso "perdidos" para recarregar a tela) e os contadores ficam num dicionário por post, em que o valor novo substitui
+# o antigo: um cliente atrasado recebe só a contagem mais recente de cada post, não todas as intermediárias
+class Assinante:
+    def __init__(self, id_user, tamanho_fila):
+        self.id_user = id_user
+        self.fila = deque(maxlen=tamanho_fila)
+        self.contadores = {} # id_post -> {'id_post', 'likes', 'dislikes'}
+        self.perdidos = 0
+        self._acordar = asyncio.Event()
+
+    def entregar(self, evento, dados):
+        if len(self.fila) == self.fila.maxlen:
+            self.perdidos += 1
+        self.fila.append((evento, dados))
+        self._acordar.set()
+
+    def entregar_contadores(self, contadores):
+        self.contadores[contadores['id_post']] = contadores
+        self._acordar.set()
+
+    # Função que espera até ter algo para enviar (ou o tempo acabar) e devolve as mensagens prontas no formato do SSE
+    async def proximas(self, timeout):
+        try:
+            await asyncio.wait_for(self._acordar.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._acordar.clear()
+        mensagens = []
+        if self.perdidos:
+            mensagens.append(('perdidos', {'quantidade': self.perdidos}))
+            self.perdidos = 0
+        while self.fila:
+            mensagens.append(self.fila.popleft())
+        mensagens.extend(('contadores', contadores) for contadores in self.contadores.values())
+        self.contadores = {}
+        return [f'event: {evento}\ndata: {orjson.dumps(dados).decode()}\n\n' for evento, dados in mensagens]
+
+
+# Hub de eventos em memória (um por processo): as rotas publicam e cada cliente conectado recebe pelo canal SSE
+# - post novo: para o autor e os seguidores dele que estiverem conectados
+# - post editado/deletado: para todos
+# - likes/dislikes: agrupados por post e enviados no máximo uma vez a cada EVENTOS_INTERVALO, com a contagem atual
+class HubEventos:
+    def __init__(self, intervalo, tamanho_fila, max_assinantes):
+        self.intervalo = intervalo
+        self.tamanho_fila = tamanho_fila
+        self.max_assinantes = max_assinantes
+        self.assinantes = set()
+        self.posts_alterados = set() # posts com likes/dislikes alterados desde o último envio
+        self._tarefa = None
+
+    # Função chamada pela rota antes de abrir o canal (o limite é por processo)
+    def verificar_vaga(self):
+        if len(self.assinantes) >= self.max_assinantes:
+            raise HTTPException(status_code=503, detail='Muitas conexões abertas, tente novamente em instantes', headers={'Retry-After': '5'})
+
+    # Função para conectar um cliente
+    def entrar(self, id_user):
+        assinante = Assinante(id_user, self.tamanho_fila)
+        self.assinantes.add(assinante)
+        return assinante
+
+    def sair(self, assinante):
+        self.assinantes.discard(assinante)
+
+    def publicar(self, evento, dados, destinatarios=None):
+        for assinante in self.assinantes:
+            if destinatarios is None or assinante.id_user in destinatarios:
+                assinante.entregar(evento, dados)
+
+    # Função chamada depois do commit de um post novo: só consulta o banco se houver alguém conectado
+    async def post_criado(self, session, id_post):
+        if not self.assinantes:
+            return
+        post = (await session.execute(select(*colunas_post).where(Postagem.id_post==id_post))).mappings().first()
+        if not post:
+            return
+        conectados = {assinante.id_user for assinante in self.assinantes}
+        seguidores = await session.execute( # pela chave primária (id_seguidor, id_seguido): só os usuários conectados
+            select(Seguidor.id_seguidor).where(Seguidor.id_seguido==post['id_user'], Seguidor.id_seguidor.in_(conectados))
+        )
+        destinatarios = set(seguidores.scalars()) | {post['id_user']}
+        self.publicar('post_criado', {**post, 'likes': post['likes'] or 0, 'dislikes': post['dislikes'] or 0}, destinatarios)
+
+    def post_editado(self, post):
+        self.publicar('post_editado', {'id_post': post['id_post'], 'text': post['text']})
+
+    def post_deletado(self, id_post):
+        self.posts_alterados.discard(id_post)
+        for assinante in self.assinantes:
+            assinante.contadores.pop(id_post, None)
+        self.publicar('post_deletado', {'id_post': id_post})
+
+    # Função chamada a cada reação: só marca o post; o envio sai agrupado no próximo intervalo
+    def contadores_alterados(self, id_post):
+        if self.assinantes:
+            self.posts_alterados.add(id_post)
+
+    # Função que lê a contagem atual dos posts alterados (uma consulta) e entrega para todos os clientes
+    async def enviar_contadores(self):
+        if not self.posts_alterados:
+            return
+        ids_posts, self.posts_alterados = list(self.posts_alterados), set()
+        if not self.assinantes:
+            return
+        async with SessaoAsync() as session:
+            contadores = await agregador.ler_contadores(session, ids_posts)
+        for post in contadores:
+            dados = {'id_post': post['id_post'], 'likes': post['likes'] or 0, 'dislikes': post['dislikes'] or 0}
+            for assinante in self.assinantes:
+                assinante.entregar_contadores(dados)
+
+    async def _rodar(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.enviar_contadores()
+            except Exception:
+                logger.exception('Erro ao enviar os contadores dos posts, tentando de novo no próximo intervalo')
+
+    # Função chamada na subida da API
+    def iniciar(self):
+        self._tarefa = asyncio.create_task(self._rodar())
+
+    # Função chamada na parada da API
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+
+hub = HubEventos(EVENTOS_INTERVALO, EVENTOS_FILA, EVENTOS_MAX_ASSINANTES)
+
+
+# Função geradora do canal SSE de um cliente (a conexão com o banco da dependência já foi devolvida quando o envio começa,
+# então uma conexão aberta aqui não prende o pool); entra no hub só quando o envio começa e sai quando o cliente desconecta
+async def transmitir(id_user, ping=EVENTOS_PING):
+    assinante = hub.entrar(id_user)
+    try:
+        yield 'retry: 3000\n\n' # o navegador reconecta em 3 segundos se cair
+        while True:
+            mensagens = await assinante.proximas(ping)
+            if not mensagens:
+                yield ': ping\n\n'
+            for mensagem in mensagens:
+                yield mensagem
+    finally:
+        hub.sair(assinante)
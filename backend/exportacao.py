@@ -0,0 +1,153 @@
+from sqlalchemy import select
+from models import Postagem, Reacao, SessaoAsync, db
+from reacoes import LIKE, NOMES
+import argparse
+import csv
+import io
+import orjson
+import os
+import sys
+import zlib
+
+EXPORTACAO_LOTE = int(os.getenv('EXPORTACAO_LOTE', '1000')) # quantos posts (e quantas reações) são lidos do cursor do banco por vez
+EXPORTACAO_USUARIOS = {int(id_user) for id_user in os.getenv('EXPORTACAO_USUARIOS', '').split(',') if id_user.strip()} # IDs que podem usar a rota de exportação (vazio: só pela linha de comando)
+
+FORMATOS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'} # formato -> tipo do conteúdo
+CAMPOS = ['registro', 'id_post', 'id_user', 'username', 'text', 'date_time', 'likes', 'dislikes', 'reacao'] # colunas do CSV
+CAMPOS_POST = ['id_post', 'id_user', 'username', 'text', 'date_time']
+
+colunas_post = [Postagem.id_post, Postagem.id_user, Postagem.username, Postagem.text, Postagem.date_time] # mesma ordem de CAMPOS_POST
+
+
+# posts em ordem de ID (chave primária), continuando depois do último ID já exportado
+def consulta_posts(apos_id):
+    return select(*colunas_post).where(Postagem.id_post > apos_id).order_by(Postagem.id_post)
+
+
+# reações dos posts de um lote, em ordem da chave primária (id_post, id_user): leitura em intervalo, sem ordenação,
+# também lida com um cursor (um post pode ter milhões de reações)
+def consulta_reacoes(primeiro_id, ultimo_id):
+    return (
+        select(Reacao.id_post, Reacao.id_user, Reacao.tipo)
+        .where(Reacao.id_post.between(primeiro_id, ultimo_id))
+        .order_by(Reacao.id_post, Reacao.id_user)
+        .execution_options(yield_per=EXPORTACAO_LOTE)
+    )
+
+
+# Exportador: transforma os posts e as reações nos bytes do arquivo, comprimindo aos poucos se pedido.
+# Cada reação vira um registro próprio ({"registro": "reacao", "id_post", "id_user" de quem reagiu, "reacao"}) e o registro
+# do post ({"registro": "post", ..., "likes", "dislikes"}) vem depois das reações dele, com os contadores tirados das próprias
+# reações exportadas (o arquivo é consistente mesmo com likes ainda não gravados pelo agregador). Só guarda o lote de posts
+# atual e um pedaço das reações, então a memória não cresce com o tamanho da tabela nem com as reações de um post;
+# é usado pela rota e pela linha de comando
+class Exportador:
+    def __init__(self, formato='ndjson', comprimir=False):
+        self.formato = formato
+        self._compressor = zlib.compressobj(wbits=31) if comprimir else None # wbits=31: formato gzip
+        self._posts = []
+        self._posicao = 0
+        self._likes = self._dislikes = 0
+
+    def _saida(self, registros):
+        if self.formato == 'csv':
+            dados = self._csv([[registro.get(campo, '') for campo in CAMPOS] for registro in registros])
+        else:
+            dados = b''.join(orjson.dumps(registro) + b'\n' for registro in registros)
+        return self._compressor.compress(dados) if self._compressor else dados
+
+    # Função que devolve o começo do arquivo (cabeçalho do CSV)
+    def cabecalho(self):
+        if self.formato == 'csv':
+            dados = self._csv([CAMPOS])
+            return self._compressor.compress(dados) if self._compressor else dados
+        return b''
+
+    # Função chamada a cada lote de posts (em ordem de id_post), antes das reações deles
+    def lote(self, posts):
+        self._posts = posts
+        self._posicao = 0
+        self._likes = self._dislikes = 0
+
+    def _fechar_post(self, registros):
+        registros.append({'registro': 'post', **dict(zip(CAMPOS_POST, self._posts[self._posicao])), 'likes': self._likes, 'dislikes': self._dislikes})
+        self._posicao += 1
+        self._likes = self._dislikes = 0
+
+    # Função que recebe um pedaço das reações do lote (em ordem de id_post, como os posts: merge join) e devolve os bytes
+    # das reações e dos posts que já terminaram
+    def reacoes(self, reacoes):
+        registros = []
+        for reacao in reacoes:
+            while self._posicao < len(self._posts) and self._posts[self._posicao].id_post < reacao.id_post:
+                self._fechar_post(registros)
+            if self._posicao == len(self._posts) or self._posts[self._posicao].id_post != reacao.id_post: # reação sem post (não deveria existir)
+                continue
+            if reacao.tipo == LIKE:
+                self._likes += 1
+            else:
+                self._dislikes += 1
+            registros.append({'registro': 'reacao', 'id_post': reacao.id_post, 'id_user': reacao.id_user, 'reacao': NOMES[reacao.tipo]})
+        return self._saida(registros)
+
+    # Função chamada depois da última reação do lote: devolve os posts que ainda faltam
+    def fim_lote(self):
+        registros = []
+        while self._posicao < len(self._posts):
+            self._fechar_post(registros)
+        return self._saida(registros)
+
+    # Função que devolve o final do arquivo (o que ainda estiver no compressor)
+    def final(self):
+        return self._compressor.flush() if self._compressor else b''
+
+    def _csv(self, linhas):
+        texto = io.StringIO()
+        csv.writer(texto).writerows(linhas)
+        return texto.getvalue().encode()
+
+
+# Função geradora usada pela StreamingResponse: abre a própria sessão (a sessão da dependência já foi fechada quando o
+# corpo começa a ser enviado) e lê os posts e as reações com cursores do banco, EXPORTACAO_LOTE linhas por vez
+async def exportar_async(apos_id=0, formato='ndjson', comprimir=False):
+    exportador = Exportador(formato, comprimir)
+    yield exportador.cabecalho()
+    async with SessaoAsync() as session:
+        resultado = await session.stream(consulta_posts(apos_id).execution_options(yield_per=EXPORTACAO_LOTE))
+        async for posts in resultado.partitions():
+            exportador.lote(posts)
+            reacoes = await session.stream(consulta_reacoes(posts[0].id_post, posts[-1].id_post))
+            async for parte in reacoes.partitions():
+                yield exportador.reacoes(parte)
+            yield exportador.fim_lote()
+    yield exportador.final()
+
+
+# Função usada pela linha de comando: mesma exportação com a conexão síncrona, escrevendo direto no arquivo
+def exportar(arquivo, apos_id=0, formato='ndjson', comprimir=False):
+    exportador = Exportador(formato, comprimir)
+    arquivo.write(exportador.cabecalho())
+    with db.connect() as conexao:
+        resultado = conexao.execute(consulta_posts(apos_id).execution_options(yield_per=EXPORTACAO_LOTE))
+        for posts in resultado.partitions():
+            exportador.lote(posts)
+            for parte in conexao.execute(consulta_reacoes(posts[0].id_post, posts[-1].id_post)).partitions():
+                arquivo.write(exportador.reacoes(parte))
+            arquivo.write(exportador.fim_lote())
+    arquivo.write(exportador.final())
+
+
+# uso: python exportacao.py [--formato ndjson|csv] [--gzip] [--apos-id ID] [--saida ARQUIVO]
+# (para continuar uma exportação interrompida, --apos-id recebe o id_post do último registro "post" que chegou: ele vem depois das reações)
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description='Exporta os posts e as reações')
+    argumentos.add_argument('--formato', choices=list(FORMATOS), default='ndjson')
+    argumentos.add_argument('--gzip', action='store_true')
+    argumentos.add_argument('--apos-id', type=int, default=0)
+    argumentos.add_argument('--saida')
+    opcoes = argumentos.parse_args()
+    if opcoes.saida:
+        with open(opcoes.saida, 'wb') as arquivo:
+            exportar(arquivo, opcoes.apos_id, opcoes.formato, opcoes.gzip)
+    else:
+        exportar(sys.stdout.buffer, opcoes.apos_id, opcoes.formato, opcoes.gzip)
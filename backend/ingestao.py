@@ -0,0 +1,181 @@
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import DateTime, bindparam, func, insert, select
+from datetime import datetime, timedelta, timezone
+from models import Postagem, Usuario
+from schemas import PostLoteSchema
+from timeline import distribuir_posts
+from metricas import registrar_lote
+import codecs
+import json
+import os
+
+INGESTAO_LOTE = int(os.getenv('INGESTAO_LOTE', '1000')) # quantos posts são gravados por transação na carga em lote
+INGESTAO_LOTE_MAXIMO = int(os.getenv('INGESTAO_LOTE_MAXIMO', '5000')) # maior lote que o cliente pode pedir
+INGESTAO_MAX_REGISTRO = int(os.getenv('INGESTAO_MAX_REGISTRO', str(64 * 1024))) # tamanho máximo de um registro (bytes/caracteres)
+INGESTAO_MAX_ERROS = int(os.getenv('INGESTAO_MAX_ERROS', '1000')) # quantos erros entram na resposta (o resto só é contado)
+INGESTAO_USUARIOS = {int(id_user) for id_user in os.getenv('INGESTAO_USUARIOS', '').split(',') if id_user.strip()} # IDs que podem usar a rota de carga em lote (que grava posts em nome de qualquer autor)
+INGESTAO_TOLERANCIA_FUTURO = float(os.getenv('INGESTAO_TOLERANCIA_FUTURO', '300')) # segundos à frente do relógio do servidor aceitos no date_time (diferença entre relógios)
+
+tabela_posts = Postagem.__table__
+
+# INSERT usado na gravação do lote (executemany, enviado em blocos de VALUES pelo SQLAlchemy) devolvendo os IDs criados
+# (sem sort_by_parameter_order: no SQLite isso faria o SQLAlchemy voltar a um INSERT por linha, e a ordem não importa aqui)
+# posts sem data recebem a data do banco, no mesmo formato dos criados pela rota /postar
+inserir_posts = insert(tabela_posts).values(
+    id_user=bindparam('b_id_user'),
+    user=bindparam('b_username'),
+    text=bindparam('b_text'),
+    date_time=func.coalesce(bindparam('b_date_time', type_=DateTime), func.now()),
+).returning(tabela_posts.c.id_post)
+
+
+# Função que lê o corpo da requisição aos poucos e devolve cada registro como (índice, registro cru ou None, erro ou None)
+# - array JSON: [{...}, {...}] (cada objeto é lido com raw_decode assim que chega inteiro)
+# - NDJSON: um objeto JSON por linha
+# O formato é descoberto pelo primeiro caractere do corpo, então nenhum dos dois precisa caber na memória
+async def ler_registros(partes):
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    buffer = ''
+    formato = None
+    descartando = False
+    indice = 0
+    fim = False
+    partes = partes.__aiter__()
+    while not fim:
+        try:
+            buffer += decodificador.decode(await partes.__anext__())
+        except StopAsyncIteration:
+            buffer += decodificador.decode(b'', final=True)
+            fim = True
+        if formato is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            formato = 'array' if buffer[0] == '[' else 'ndjson'
+            if formato == 'array':
+                buffer = buffer[1:]
+
+        if formato == 'ndjson':
+            linhas = buffer.split('\n')
+            buffer = '' if fim else linhas.pop() # a última linha pode estar incompleta
+            for linha in linhas:
+                if descartando: # resto de uma linha grande demais, já recusada
+                    descartando = False
+                elif len(linha) > INGESTAO_MAX_REGISTRO: # linha inteira, mas acima do limite
+                    yield indice, None, 'Registro muito grande'
+                    indice += 1
+                elif linha.strip():
+                    yield indice, linha, None
+                    indice += 1
+            if len(buffer) > INGESTAO_MAX_REGISTRO: # linha sem fim: recusa e descarta até a próxima quebra de linha
+                if not descartando:
+                    yield indice, None, 'Registro muito grande'
+                    indice += 1
+                descartando = True
+                buffer = ''
+
+        else: # array
+            posicao = 0
+            while True:
+                while posicao < len(buffer) and buffer[posicao] in ' \t\r\n,':
+                    posicao += 1
+                if posicao < len(buffer) and buffer[posicao] == ']':
+                    return
+                if posicao == len(buffer):
+                    break
+                try:
+                    registro, fim_registro = json_decoder.raw_decode(buffer, posicao)
+                except json.JSONDecodeError as erro:
+                    if fim or len(buffer) - posicao > INGESTAO_MAX_REGISTRO: # não é falta de dados: o JSON está quebrado
+                        yield indice, None, f'JSON inválido: {erro.msg}'
+                        return
+                    break # o registro ainda não chegou inteiro
+                tamanho, posicao = fim_registro - posicao, fim_registro
+                if tamanho > INGESTAO_MAX_REGISTRO: # objeto que chegou inteiro num pedaço só, mas acima do limite
+                    yield indice, None, 'Registro muito grande'
+                elif isinstance(registro, dict):
+                    yield indice, registro, None
+                else:
+                    yield indice, None, 'O registro deve ser um objeto JSON'
+                indice += 1
+            buffer = buffer[posicao:]
+            if fim:
+                yield indice, None, 'JSON inválido: array sem "]" no final'
+
+
+# Função que valida um registro cru (linha NDJSON ou objeto já lido do array) com o PostLoteSchema; devolve (post, None) ou (None, mensagem de erro)
+def validar_registro(registro):
+    try:
+        if isinstance(registro, str):
+            post = PostLoteSchema.model_validate_json(registro)
+        else:
+            post = PostLoteSchema.model_validate(registro)
+    except ValidationError as erro:
+        return None, '; '.join(f"{'.'.join(map(str, detalhe['loc'])) or 'registro'}: {detalhe['msg']}" for detalhe in erro.errors())
+    return post, None
+
+
+# Função que grava um lote de posts já validados em uma transação: confere os autores com uma consulta só,
+# insere todos os posts (executemany) e distribui nas timelines com um INSERT ... SELECT (a busca é mantida pelos triggers)
+# Devolve (quantidade inserida, lista de (índice, erro) dos recusados)
+async def gravar_lote(session, lote):
+    autores = dict((await session.execute(
+        select(Usuario.id_user, Usuario.username).where(Usuario.id_user.in_({post.id_user for _, post in lote}))
+    )).all())
+    parametros = []
+    erros = []
+    limite_data = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=INGESTAO_TOLERANCIA_FUTURO)
+    for indice, post in lote:
+        if autores.get(post.id_user) != post.username:
+            erros.append((indice, 'Usuário não encontrado'))
+            continue
+        date_time = post.date_time
+        if date_time is not None and date_time.tzinfo is not None: # o banco guarda as datas em UTC sem fuso
+            date_time = date_time.astimezone(timezone.utc).replace(tzinfo=None)
+        if date_time is not None and date_time > limite_data: # um post no futuro ficaria no topo das listagens e dos feeds até a data chegar
+            erros.append((indice, 'A data do post não pode estar no futuro'))
+            continue
+        parametros.append({'b_id_user': post.id_user, 'b_username': post.username, 'b_text': post.text, 'b_date_time': date_time})
+    if parametros:
+        ids_posts = (await session.execute(inserir_posts, parametros)).scalars().all()
+        await distribuir_posts(session, list(ids_posts))
+    await session.commit()
+    return len(parametros), erros
+
+
+# Função da carga em lote: lê os registros do corpo, valida um a um e grava a cada `tamanho_lote` posts válidos
+# Registros com erro não interrompem a carga; os lotes já gravados continuam gravados mesmo se um lote posterior falhar
+async def ingerir_posts(session, partes, tamanho_lote=INGESTAO_LOTE):
+    resultado = {'recebidos': 0, 'inseridos': 0, 'rejeitados': 0, 'erros': []}
+
+    def rejeitar(indice, erro):
+        resultado['rejeitados'] += 1
+        if len(resultado['erros']) < INGESTAO_MAX_ERROS:
+            resultado['erros'].append({'indice': indice, 'erro': erro})
+
+    async def gravar(lote):
+        registrar_lote() # as consultas de cada lote se repetem a cada lote (não é N+1)
+        inseridos, erros = await gravar_lote(session, lote)
+        resultado['inseridos'] += inseridos
+        for indice, erro in erros:
+            rejeitar(indice, erro)
+
+    lote = []
+    async for indice, registro, erro in ler_registros(partes):
+        resultado['recebidos'] += 1
+        if erro is None:
+            post, erro = validar_registro(registro)
+        if erro is not None:
+            rejeitar(indice, erro)
+            continue
+        lote.append((indice, post))
+        if len(lote) >= tamanho_lote:
+            await gravar(lote)
+            lote = []
+    if lote:
+        await gravar(lote)
+    if not resultado['recebidos']:
+        raise HTTPException(status_code=400, detail='Nenhum post enviado')
+    return resultado
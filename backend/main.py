@@ -1,7 +1,9 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 import os
 
 load_dotenv()
@@ -10,13 +12,34 @@ SECRET_KEY = os.getenv('SECRET_KEY') # chave para descriptografar as senhas
 ALGORITHM = os.getenv('ALGORITHM') # algoritmo de codificação do token
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES')) # tempo de expiração do token (30 minutos)
 
-app = FastAPI() # criando o objeto da API
+# Função que roda na subida e na parada da API
+@asynccontextmanager
+async def lifespan(app):
+    pool_senhas.iniciar() # threads do bcrypt
+    agregador.iniciar() # gravação periódica dos contadores de likes/dislikes
+    hub.iniciar() # envio periódico dos contadores para o canal de eventos
+    await tendencias.aquecer() # ranking de posts em alta a partir dos posts recentes
+    yield
+    await hub.parar()
+    await agregador.parar() # gravando os contadores que ainda estão na memória
+    pool_senhas.fechar() # esperando os hashes em andamento terminarem
+    await db_async.dispose() # fechando as conexões do pool do banco
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse) # criando o objeto da API (respostas serializadas com orjson)
 
 bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto') # criptografando as senhas
 oauth2_schema = OAuth2PasswordBearer(tokenUrl='auth/login-form') # login autenticado
 
 from auth_routes import auth_router # importando o roteador de autenticação
 from order_routes import order_router # importando o roteador de criação, leitura, atualização e deleta de dados
+from senhas import pool_senhas # pool de threads do bcrypt
+from models import db_async # conexão assíncrona com o banco
+from contadores import agregador # contadores de likes/dislikes em memória
+from eventos import hub # canal de eventos em tempo real
+from tendencias import tendencias # ranking de posts em alta
+from metricas import MiddlewareMetricas, metricas_router # métricas de desempenho (/metrics)
 
 app.include_router(auth_router) # incluindo o roteador de autenticação
-app.include_router(order_router) # incluindo o roteador de pedidos
\ No newline at end of file
+app.include_router(order_router) # incluindo o roteador de pedidos
+app.include_router(metricas_router) # incluindo a rota de métricas
+app.add_middleware(MiddlewareMetricas) # medindo cada requisição (latência, status e consultas ao banco)
\ No newline at end of file
@@ -0,0 +1,258 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from sqlalchemy import event
+from collections import Counter
+from contextvars import ContextVar
+from models import db, db_async
+from cache import cache_usuarios
+from senhas import pool_senhas
+from contadores import agregador
+import logging
+import os
+import threading
+import time
+
+METRICAS_CONSULTA_LENTA_MS = float(os.getenv('METRICAS_CONSULTA_LENTA_MS', '100')) # consultas acima disso são registradas no log como lentas
+METRICAS_N_MAIS_1 = int(os.getenv('METRICAS_N_MAIS_1', '10')) # a mesma consulta repetida mais vezes que isso numa requisição indica N+1 (fora as repetições por lote)
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1' # envia o cabeçalho Server-Timing (tempo no banco x tempo na aplicação)
+
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # segundos
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100) # consultas por requisição
+
+logger = logging.getLogger(__name__)
+
+metricas_router = APIRouter(tags=['métricas'])
+
+
+# Consultas feitas durante uma requisição (um objeto por requisição, guardado numa ContextVar: os eventos do banco
+# rodam no contexto da requisição, inclusive dentro do greenlet do SQLAlchemy assíncrono)
+class ConsultasRequisicao:
+    def __init__(self):
+        self.quantidade = 0
+        self.duracao = 0.0
+        self.lentas = 0
+        self.repeticoes = Counter() # SQL -> quantas vezes rodou
+        self.lotes = 0 # lotes processados (cada lote repete as mesmas consultas de propósito: ver registrar_lote)
+
+
+consultas_atuais = ContextVar('consultas_atuais', default=None)
+
+
+# Histograma cumulativo no formato do Prometheus
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.contagem = 0
+
+    def observar(self, valor):
+        for posicao, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[posicao] += 1
+        self.soma += valor
+        self.contagem += 1
+
+
+# Registro de todas as métricas da API (atualizado pelo middleware no fim de cada requisição)
+class RegistroMetricas:
+    def __init__(self):
+        self.em_andamento = 0
+        self.streams_abertos = 0 # respostas text/event-stream abertas (/order/eventos), fora do em_andamento
+        self.requisicoes = Counter() # (rota, método, status) -> quantidade
+        self.duracoes = {} # (rota, método) -> Histograma
+        self.duracao_streams = Counter() # rota -> segundos dos streams já fechados (ficam fora do histograma de latência)
+        self.consultas_por_requisicao = {} # rota -> Histograma
+        self.consultas = Counter() # rota -> consultas
+        self.duracao_consultas = Counter() # rota -> segundos no banco
+        self.consultas_lentas = Counter() # rota -> consultas lentas
+        self.n_mais_1 = Counter() # rota -> requisições com a mesma consulta repetida demais
+        self.consultas_fora = 0 # consultas fora de requisições (gravação dos contadores, scripts)
+        self.duracao_fora = 0.0
+        self._lock = threading.Lock() # as consultas fora de requisição podem vir de outras threads
+
+    # Função chamada no fim de cada requisição
+    def registrar(self, rota, metodo, status, duracao, consultas, stream=False):
+        self.requisicoes[(rota, metodo, status)] += 1
+        if stream: # um stream dura o tempo que o cliente ficar conectado: no histograma cairia sempre no +Inf
+            self.duracao_streams[rota] += duracao
+        else:
+            self.duracoes.setdefault((rota, metodo), Histograma(BUCKETS_DURACAO)).observar(duracao)
+        self.consultas_por_requisicao.setdefault(rota, Histograma(BUCKETS_CONSULTAS)).observar(consultas.quantidade)
+        self.consultas[rota] += consultas.quantidade
+        self.duracao_consultas[rota] += consultas.duracao
+        self.consultas_lentas[rota] += consultas.lentas
+        if consultas.repeticoes:
+            sql, vezes = consultas.repeticoes.most_common(1)[0]
+            if vezes - consultas.lotes > METRICAS_N_MAIS_1: # uma consulta por lote é esperada; uma por item do lote, não
+                self.n_mais_1[rota] += 1
+                logger.warning('Possível N+1 em %s %s: a mesma consulta rodou %d vezes: %s', metodo, rota, vezes, ' '.join(sql.split())[:500])
+
+    def registrar_fora(self, duracao):
+        with self._lock:
+            self.consultas_fora += 1
+            self.duracao_fora += duracao
+
+
+registro = RegistroMetricas()
+
+
+# Função chamada a cada lote por rotas que rodam as mesmas consultas uma vez por lote (carga em lote),
+# para essas repetições não serem confundidas com N+1
+def registrar_lote():
+    consultas = consultas_atuais.get()
+    if consultas is not None:
+        consultas.lotes += 1
+
+
+# Funções ligadas aos eventos do SQLAlchemy que medem cada consulta e somam na requisição atual
+def marcar_inicio(conexao, cursor, sql, parametros, contexto, executemany):
+    conexao.info.setdefault('inicio_consultas', []).append((contexto, time.perf_counter()))
+
+
+def marcar_fim(conexao, cursor, sql, parametros, contexto, executemany):
+    duracao = time.perf_counter() - conexao.info['inicio_consultas'].pop()[1]
+    if duracao * 1000 > METRICAS_CONSULTA_LENTA_MS:
+        logger.warning('Consulta lenta (%.1f ms): %s', duracao * 1000, ' '.join(sql.split())[:500])
+    consultas = consultas_atuais.get()
+    if consultas is None:
+        registro.registrar_fora(duracao)
+        return
+    consultas.quantidade += 1
+    consultas.duracao += duracao
+    consultas.repeticoes[sql] += 1
+    if duracao * 1000 > METRICAS_CONSULTA_LENTA_MS:
+        consultas.lentas += 1
+
+
+# consulta que deu erro não passa pelo after_cursor_execute: tirando o início dela da pilha da conexão
+def descartar_inicio(erro):
+    if erro.connection is None or erro.execution_context is None:
+        return
+    inicios = erro.connection.info.get('inicio_consultas')
+    if inicios:
+        inicios[:] = [(contexto, inicio) for contexto, inicio in inicios if contexto is not erro.execution_context]
+
+
+for engine in (db, db_async.sync_engine): # conexão síncrona (scripts) e a assíncrona (rotas)
+    event.listen(engine, 'before_cursor_execute', marcar_inicio)
+    event.listen(engine, 'after_cursor_execute', marcar_fim)
+    event.listen(engine, 'handle_error', descartar_inicio)
+
+
+# Middleware ASGI (sem BaseHTTPMiddleware, para não atrapalhar as respostas em streaming) que mede cada requisição
+# por rota: usa o caminho com os parâmetros (ex: /order/like_post/{id_post}), então a quantidade de séries não cresce com os IDs
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        consultas = ConsultasRequisicao()
+        token = consultas_atuais.set(consultas)
+        inicio = time.perf_counter()
+        status = 500 # se a aplicação falhar antes de responder
+        stream = False
+
+        async def enviar(mensagem):
+            nonlocal status, stream
+            if mensagem['type'] == 'http.response.start':
+                status = mensagem['status']
+                if MutableHeaders(scope=mensagem).get('content-type', '').startswith('text/event-stream'): # passa do em_andamento para os streams abertos
+                    stream = True
+                    registro.em_andamento -= 1
+                    registro.streams_abertos += 1
+                if SERVER_TIMING: # tempo até o início da resposta, separado entre banco e aplicação
+                    total = (time.perf_counter() - inicio) * 1000
+                    banco = consultas.duracao * 1000
+                    MutableHeaders(scope=mensagem).append('Server-Timing', f'db;dur={banco:.1f};desc="{consultas.quantidade} consultas", app;dur={total - banco:.1f}')
+            await send(mensagem)
+
+        registro.em_andamento += 1
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if stream:
+                registro.streams_abertos -= 1
+            else:
+                registro.em_andamento -= 1
+            consultas_atuais.reset(token)
+            rota = scope['route'].path if 'route' in scope else 'sem_rota'
+            registro.registrar(rota, scope['method'], status, time.perf_counter() - inicio, consultas, stream)
+
+
+# Funções que montam o texto no formato do Prometheus
+def escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def rotulos(**valores):
+    if not valores:
+        return ''
+    return '{' + ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in valores.items()) + '}'
+
+
+def metrica(linhas, nome, tipo, ajuda, valores):
+    linhas.append(f'# HELP {nome} {ajuda}')
+    linhas.append(f'# TYPE {nome} {tipo}')
+    for rotulo, valor in valores:
+        linhas.append(f'{nome}{rotulo} {valor}')
+
+
+def histograma(linhas, nome, ajuda, series):
+    linhas.append(f'# HELP {nome} {ajuda}')
+    linhas.append(f'# TYPE {nome} histogram')
+    for rotulos_serie, serie in series:
+        for limite, contagem in zip(serie.buckets, serie.contagens):
+            linhas.append(f'{nome}_bucket{rotulos(**rotulos_serie, le=limite)} {contagem}')
+        linhas.append(f'{nome}_bucket{rotulos(**rotulos_serie, le="+Inf")} {serie.contagem}')
+        linhas.append(f'{nome}_sum{rotulos(**rotulos_serie)} {serie.soma}')
+        linhas.append(f'{nome}_count{rotulos(**rotulos_serie)} {serie.contagem}')
+
+
+# Função que gera o texto do /metrics
+def gerar_metricas():
+    linhas = []
+    metrica(linhas, 'http_requisicoes_em_andamento', 'gauge', 'Requisições sendo atendidas agora (fora os streams de eventos)', [('', registro.em_andamento)])
+    metrica(linhas, 'http_streams_abertos', 'gauge', 'Streams de eventos (text/event-stream) abertos agora', [('', registro.streams_abertos)])
+    metrica(linhas, 'http_requisicoes_total', 'counter', 'Requisições atendidas por rota, método e status',
+            [(rotulos(rota=rota, metodo=metodo, status=status), quantidade) for (rota, metodo, status), quantidade in sorted(registro.requisicoes.items())])
+    histograma(linhas, 'http_duracao_segundos', 'Duração das requisições por rota e método (fora os streams de eventos)',
+               [({'rota': rota, 'metodo': metodo}, serie) for (rota, metodo), serie in sorted(registro.duracoes.items())])
+    metrica(linhas, 'http_streams_duracao_segundos_total', 'counter', 'Tempo de conexão dos streams de eventos já fechados, por rota',
+            [(rotulos(rota=rota), duracao) for rota, duracao in sorted(registro.duracao_streams.items())])
+    histograma(linhas, 'db_consultas_por_requisicao', 'Consultas ao banco feitas em cada requisição, por rota',
+               [({'rota': rota}, serie) for rota, serie in sorted(registro.consultas_por_requisicao.items())])
+    metrica(linhas, 'db_consultas_total', 'counter', 'Consultas ao banco por rota',
+            [(rotulos(rota=rota), quantidade) for rota, quantidade in sorted(registro.consultas.items())] + [(rotulos(rota='fora_de_requisicao'), registro.consultas_fora)])
+    metrica(linhas, 'db_duracao_segundos_total', 'counter', 'Tempo gasto no banco por rota',
+            [(rotulos(rota=rota), duracao) for rota, duracao in sorted(registro.duracao_consultas.items())] + [(rotulos(rota='fora_de_requisicao'), registro.duracao_fora)])
+    metrica(linhas, 'db_consultas_lentas_total', 'counter', f'Consultas acima de {METRICAS_CONSULTA_LENTA_MS:g} ms por rota',
+            [(rotulos(rota=rota), quantidade) for rota, quantidade in sorted(registro.consultas_lentas.items())])
+    metrica(linhas, 'db_n_mais_1_total', 'counter', f'Requisições em que a mesma consulta rodou mais de {METRICAS_N_MAIS_1} vezes, por rota',
+            [(rotulos(rota=rota), quantidade) for rota, quantidade in sorted(registro.n_mais_1.items())])
+
+    cache = cache_usuarios.estatisticas()
+    metrica(linhas, 'cache_usuarios_itens', 'gauge', 'Usuários guardados no cache', [('', cache['tamanho'])])
+    for nome in ('hits', 'misses', 'expirados', 'removidos'):
+        metrica(linhas, f'cache_usuarios_{nome}_total', 'counter', f'Contador de {nome} do cache de usuários', [('', cache[nome])])
+
+    senhas = pool_senhas.estatisticas()
+    metrica(linhas, 'bcrypt_pendentes', 'gauge', 'Operações do bcrypt na fila ou rodando', [('', senhas['pendentes'])])
+    metrica(linhas, 'bcrypt_recusadas_total', 'counter', 'Operações do bcrypt recusadas por fila cheia', [('', senhas['recusadas'])])
+    metrica(linhas, 'bcrypt_operacoes_total', 'counter', 'Operações do bcrypt feitas', [(rotulos(operacao=operacao), senhas[operacao]['contagem']) for operacao in ('hash', 'verify')])
+    metrica(linhas, 'bcrypt_duracao_segundos', 'gauge', 'Tempo das últimas operações do bcrypt (média e percentis)',
+            [(rotulos(operacao=operacao, estatistica=estatistica), senhas[operacao][f'{estatistica}_ms'] / 1000) for operacao in ('hash', 'verify') for estatistica in ('media', 'p50', 'p95', 'max')])
+
+    metrica(linhas, 'contadores_posts_pendentes', 'gauge', 'Posts com likes/dislikes ainda não gravados no banco', [('', len(agregador.pendentes))])
+    metrica(linhas, 'contadores_gravacoes_total', 'counter', 'Lotes de contadores gravados no banco', [('', agregador.gravacoes)])
+    return '\n'.join(linhas) + '\n'
+
+
+# Rota das métricas no formato de texto do Prometheus
+@metricas_router.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(gerar_metricas(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,9 +1,42 @@
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import create_engine, Column, String, Integer, ForeignKey, DateTime, Boolean, UniqueConstraint, func
+from sqlalchemy import create_engine, event, Column, String, Integer, ForeignKey, DateTime, Boolean, Index, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship
-
-# criando conexão com o banco
-db = create_engine('sqlite:///banco.db')
+import os
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///banco.db') # endereço do banco
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10')) # conexões mantidas abertas no pool
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10')) # conexões extras permitidas em picos
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30')) # segundos esperando uma conexão livre
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')) # milissegundos esperando o lock de escrita antes de dar erro
+
+# criando conexão com o banco (síncrona, usada pelo alembic e por scripts)
+db = create_engine(DATABASE_URL)
+
+# criando conexão assíncrona com o banco (usada pelas rotas), com um pool de conexões reaproveitadas
+db_async = create_async_engine(
+    DATABASE_URL.replace('sqlite://', 'sqlite+aiosqlite://', 1),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+
+# fábrica de sessões assíncronas, criada uma única vez e compartilhada por todas as requisições
+SessaoAsync = async_sessionmaker(db_async, expire_on_commit=False)
+
+
+# Função que configura cada nova conexão do SQLite: WAL deixa as leituras rodarem junto com uma escrita
+# e o busy_timeout faz a escrita esperar o lock em vez de falhar na hora
+@event.listens_for(db, 'connect')
+@event.listens_for(db_async.sync_engine, 'connect')
+def aplicar_pragmas(conexao, registro):
+    if not DATABASE_URL.startswith('sqlite'):
+        return
+    cursor = conexao.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    cursor.execute('PRAGMA synchronous=NORMAL') # seguro com WAL e evita um fsync a cada commit
+    cursor.close()
 
 # criando a base do banco de dados
 Base = declarative_base()
@@ -20,6 +53,12 @@ class Usuario(Base):
     email = Column('email', String, nullable=False) # parâmetros: (nome da coluna, tipo de dado, campo não pode ser nulo)
     password = Column('password', String, nullable=False) # parâmetros: (nome da coluna, tipo de dado, campo não pode ser nulo)
     activity = Column('activity', Boolean, nullable=False, server_default='1', default=True)
+    seguidores = Column('seguidores', Integer, nullable=False, server_default='0', default=0) # quantidade de seguidores
+    fanout_leitura = Column('fanout_leitura', Boolean, nullable=False, server_default='0', default=False) # posts lidos no feed direto de Postagens (marcado ao chegar no limiar de seguidores e nunca desmarcado)
+
+    __table_args__ = (
+        Index('ix_usuarios_email', 'email'), # checagem de e-mail já cadastrado
+    )
 
     # Função de inicialização
     def __init__(self, username, email, password, activity=True): # parâmetros que serão obrigatórios na hora da criação do usuário pelo código em python
@@ -42,6 +81,11 @@ class Postagem(Base):
     likes = Column('likes', Integer, nullable=True, default=0)
     dislikes = Column('dislikes', Integer, nullable=True, default=0)
 
+    __table_args__ = (
+        Index('ix_postagens_data', 'date_time', 'id_post'), # feed geral ordenado por data (paginação por cursor)
+        Index('ix_postagens_usuario_data', 'id_user', 'date_time', 'id_post'), # posts de um usuário ordenados por data
+    )
+
     usuario_por_id = relationship('Usuario', foreign_keys=[id_user])  # relacionamento pelo id_user
     usuario_por_nome = relationship('Usuario', foreign_keys=[username])   # relacionamento pelo user (username)
 
@@ -59,37 +103,52 @@ class PostUpdate(BaseModel):
     text: str
 
 
-class LikePost(Base):
-    __tablename__ = 'Like_Posts'
+# Tabela das reações (uma linha por usuário e post, guardando se foi like ou dislike)
+class Reacao(Base):
+    __tablename__ = 'Reacoes'
 
     # Colunas da tabela
-    id_post = Column(Integer, ForeignKey('Postagens.id_post'), nullable=False, primary_key=True)
-    id_user = Column(Integer, ForeignKey('Usuarios.id_user'), nullable=False, primary_key=True)
-
-    __table_args__ = (
-        UniqueConstraint('id_post', 'id_user', name='_user_post_uc'),
-    )
+    id_post = Column('id_post', Integer, ForeignKey('Postagens.id_post'), nullable=False, primary_key=True)
+    id_user = Column('id_user', Integer, ForeignKey('Usuarios.id_user'), nullable=False, primary_key=True)
+    tipo = Column('tipo', Integer, nullable=False) # 1 = like, -1 = dislike
+    date_time = Column('date_time', DateTime, nullable=True) # quando a reação foi feita (ao desfazer, o ranking de posts em alta tira o peso dessa hora)
 
     user = relationship('Usuario', foreign_keys=[id_user])
     post = relationship('Postagem', foreign_keys=[id_post])
 
     def __repr__(self):
-        return f'<LikePost(id_post={self.id_post}, id_user={self.id_user})>'
+        return f'<Reacao(id_post={self.id_post}, id_user={self.id_user}, tipo={self.tipo})>'
 
 
-class DislikePost(Base):
-    __tablename__ = 'Dislike_Posts'
+# Tabela de quem segue quem
+class Seguidor(Base):
+    __tablename__ = 'Seguidores'
 
     # Colunas da tabela
-    id_post = Column(Integer, ForeignKey('Postagens.id_post'), nullable=False, primary_key=True)
-    id_user = Column(Integer, ForeignKey('Usuarios.id_user'), nullable=False, primary_key=True)
+    id_seguidor = Column('id_seguidor', Integer, ForeignKey('Usuarios.id_user'), nullable=False, primary_key=True) # quem segue
+    id_seguido = Column('id_seguido', Integer, ForeignKey('Usuarios.id_user'), nullable=False, primary_key=True) # quem é seguido
 
     __table_args__ = (
-        UniqueConstraint('id_post', 'id_user', name='_user_post_uc'),
+        Index('ix_seguidores_seguido', 'id_seguido', 'id_seguidor'), # lista de seguidores de um usuário (fan-out)
     )
 
-    user = relationship('Usuario', foreign_keys=[id_user])
-    post = relationship('Postagem', foreign_keys=[id_post])
+    def __repr__(self):
+        return f'<Seguidor(id_seguidor={self.id_seguidor}, id_seguido={self.id_seguido})>'
+
+
+# Tabela das timelines materializadas: cada linha é um post que aparece no feed de um usuário
+class EntradaTimeline(Base):
+    __tablename__ = 'Timelines'
+
+    # Colunas da tabela
+    id_user = Column('id_user', Integer, ForeignKey('Usuarios.id_user'), nullable=False, primary_key=True) # dono do feed
+    id_post = Column('id_post', Integer, ForeignKey('Postagens.id_post'), nullable=False, primary_key=True)
+    date_time = Column('date_time', DateTime, nullable=False) # cópia da data do post, para ordenar o feed sem ler Postagens
+
+    __table_args__ = (
+        Index('ix_timelines_user_data', 'id_user', 'date_time', 'id_post'), # leitura do feed em intervalo
+        Index('ix_timelines_post', 'id_post'), # limpeza quando o post é deletado
+    )
 
     def __repr__(self):
-        return f'<LikePost(id_post={self.id_post}, id_user={self.id_user})>'
\ No newline at end of file
+        return f'<EntradaTimeline(id_user={self.id_user}, id_post={self.id_post})>'
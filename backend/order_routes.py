@@ -1,134 +1,266 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, select, delete, update, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 from dependencies import pegar_sessao, verificar_token
-from schemas import PostSchema
-from models import Postagem, Usuario, PostUpdate, LikePost, DislikePost
+from paginacao import codificar_cursor, decodificar_cursor, LIMITE_PADRAO, LIMITE_MAXIMO
+from schemas import PostSchema, UsuarioAutenticado, PostResposta, PaginaPosts, PaginaPostsUsuario, MensagemResposta, PostEditado, ReacaoResposta, ReacoesResposta, LoteResposta, TendenciasResposta
+from models import Postagem, PostUpdate, Reacao
+from contadores import agregador, CONTADORES_USUARIOS
+from timeline import distribuir_post, remover_post, seguir, deixar_de_seguir, ler_feed
+from busca import buscar_posts
+from ingestao import ingerir_posts, INGESTAO_LOTE, INGESTAO_LOTE_MAXIMO, INGESTAO_USUARIOS
+from exportacao import exportar_async, EXPORTACAO_USUARIOS, FORMATOS
+from eventos import hub, transmitir
+from tendencias import tendencias
+from reacoes import aplicar_reacao, reacoes_do_usuario, LIKE, DISLIKE, NOMES
 
 order_router = APIRouter(prefix='/order', tags=['pedidos'], dependencies=[Depends(verificar_token )]) # criando o roteador de pedidos
 
-@order_router.get('/') # criando rota de GET (READ)
+# data/hora crua do banco (texto), usada no cursor para comparar exatamente com o valor armazenado
+data_crua = type_coerce(Postagem.date_time, String)
+
+# colunas selecionadas nas rotas que devolvem posts (mesmos campos de PostResposta): as linhas vêm como tuplas, sem montar objetos do ORM
+colunas_post = [getattr(Postagem, campo) for campo in PostResposta.model_fields]
+
+
+# Função para paginar uma consulta de postagens por (date_time, id_post), da mais nova para a mais antiga
+# sem OFFSET: o cursor vira um filtro de intervalo, então cada página custa O(limite) independente da profundidade
+async def paginar_posts(session, consulta, cursor, limit):
+    if cursor:
+        date_time, id_post = decodificar_cursor(cursor)
+        consulta = consulta.where(tuple_(data_crua, Postagem.id_post) < tuple_(date_time, id_post))
+    consulta = consulta.order_by(Postagem.date_time.desc(), Postagem.id_post.desc()).limit(limit + 1) # pegando um a mais para saber se existe próxima página
+    linhas = (await agregador.executar(session, consulta)).all()
+    next_cursor = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        next_cursor = codificar_cursor(linhas[-1].data_crua, linhas[-1].id_post)
+    return linhas, next_cursor
+
+
+# Função que transforma a linha selecionada (colunas_post) em dicionário já com os likes/dislikes que ainda não foram gravados
+def post_para_dict(linha):
+    post = {campo: linha[campo] for campo in PostResposta.model_fields}
+    post['likes'] = post['likes'] or 0 # posts antigos podem ter o contador nulo
+    post['dislikes'] = post['dislikes'] or 0
+    return agregador.mesclar(post)
+
+
+# Função que busca os posts de uma lista de IDs e devolve na mesma ordem da lista (IDs que não existem mais ficam de fora)
+async def posts_por_ids(session, ids):
+    linhas = (await agregador.executar(session, select(*colunas_post).where(Postagem.id_post.in_(ids)))).mappings()
+    posts = {linha['id_post']: linha for linha in linhas}
+    return [post_para_dict(posts[id_post]) for id_post in ids if id_post in posts]
+
+@order_router.get('/', response_model=MensagemResposta) # criando rota de GET (READ)
 async def pedidos(): # função assíncrona
     return {'mensagem': 'Você acessou o meu site'} # mensagem a ser retornada
 
 # Função para criar postagem
-@order_router.post('/postar')
-async def criar_postagem(post_schema: PostSchema, session: Session =  Depends(pegar_sessao)):
+@order_router.post('/postar', response_model=MensagemResposta)
+async def criar_postagem(post_schema: PostSchema, session: AsyncSession =  Depends(pegar_sessao)):
     new_post = Postagem(id_user=post_schema.id_user, username=post_schema.username, text=post_schema.text) # parâmetros da postagem (ID do usuário, nome do usuário e texto a ser publicado)
     session.add(new_post) # adicionando a postagem ao banco de dados
-    session.commit() # commitando a mudança
+    await session.flush() # gerando o ID do post
+    await distribuir_post(session, new_post.id_post) # colocando o post no feed de quem segue o autor
+    await session.commit() # commitando a mudança
+    tendencias.post_criado(new_post.id_post) # entrando no ranking de posts em alta
+    await hub.post_criado(session, new_post.id_post) # avisando quem está conectado no canal de eventos
     return {'mensagem': 'Postagem publicada com sucesso!'}
 
 
+# Rota de carga em lote (migração de posts de outro sistema): o corpo é um array JSON ou NDJSON de posts
+# (mesmos campos de /postar e date_time opcional), lido aos poucos e gravado em transações de `lote` posts
+# Os posts podem ser de qualquer autor, então só os usuários de INGESTAO_USUARIOS podem usar a rota
+@order_router.post('/postar_lote', response_model=LoteResposta)
+async def criar_postagens_em_lote(request: Request, lote: int = Query(INGESTAO_LOTE, ge=1, le=INGESTAO_LOTE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    if user.id_user not in INGESTAO_USUARIOS:
+        raise HTTPException(status_code=401, detail='Você não tem autorização para fazer a carga em lote')
+    return await ingerir_posts(session, request.stream(), lote)
+
 
-# Rota para listar todas as postagens
-@order_router.get('/listar_posts')
-async def listar_posts(session: Session = Depends(pegar_sessao), user: Usuario = Depends(verificar_token)):
-    posts = session.query(Postagem).all()
+
+# Rota para listar as postagens (paginada por cursor, das mais novas para as mais antigas)
+@order_router.get('/listar_posts', response_model=PaginaPosts)
+async def listar_posts(cursor: Optional[str] = None, limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    posts, next_cursor = await paginar_posts(session, select(*colunas_post, data_crua.label('data_crua')), cursor, limit)
     return {
-        'posts': posts
+        'posts': [post_para_dict(linha._mapping) for linha in posts],
+        'next_cursor': next_cursor # None quando não existem mais postagens
     }
 
 
 # Rota para listar todas as postagens do usuário cadastrado
-@order_router.get('/listar_posts_user/')
-async def listar_posts_usuario(session: Session = Depends(pegar_sessao), user: Usuario = Depends(verificar_token)):
+@order_router.get('/listar_posts_user/', response_model=Union[PaginaPostsUsuario, MensagemResposta])
+async def listar_posts_usuario(cursor: Optional[str] = None, limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
     if not user:
         raise HTTPException(status_code=401, detail='Usuário não encontrado')
-    posts = session.query(Postagem).filter(Postagem.username==user.username).all()
-    if not posts:
+    consulta = select(*colunas_post, data_crua.label('data_crua')).where(Postagem.id_user==user.id_user) # pelo ID, que tem índice junto com a data
+    posts, next_cursor = await paginar_posts(session, consulta, cursor, limit)
+    if not posts and not cursor:
         return {
             'mensagem': 'O usuário não fez nenhuma postagem'
         }
     return {
         'user': user,
-        'posts': posts
+        'posts': [post_para_dict(linha._mapping) for linha in posts],
+        'next_cursor': next_cursor
+    }
+
+
+# Rota do feed do usuário logado: posts dele e de quem ele segue (paginada por cursor, das mais novas para as mais antigas)
+@order_router.get('/feed', response_model=PaginaPosts)
+async def feed(cursor: Optional[str] = None, limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    posicao = decodificar_cursor(cursor) if cursor else None
+    pagina = await ler_feed(session, user.id_user, posicao, limit)
+    next_cursor = None
+    if len(pagina) > limit:
+        pagina = pagina[:limit]
+        next_cursor = codificar_cursor(*pagina[-1])
+    return {
+        'posts': await posts_por_ids(session, [id_post for _, id_post in pagina]),
+        'next_cursor': next_cursor
+    }
+
+
+# Rota dos posts em alta: o ranking fica em memória e é atualizado a cada post novo e reação (pontuação com
+# decaimento exponencial pela meia-vida TENDENCIAS_MEIA_VIDA); aqui só são buscados os N primeiros pelo ID
+@order_router.get('/trending', response_model=TendenciasResposta)
+async def trending(limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    ranking = tendencias.top(limit)
+    pontuacoes = dict(ranking)
+    posts = await posts_por_ids(session, [id_post for id_post, _ in ranking])
+    return {
+        'posts': [{**post, 'pontuacao': pontuacoes[post['id_post']]} for post in posts]
     }
 
 
+# Rota de busca nos textos dos posts, ordenada por relevância (bm25) e opcionalmente só de um autor (ID do usuário)
+@order_router.get('/buscar', response_model=PaginaPosts)
+async def buscar(q: str = Query(..., min_length=1, max_length=200), autor: Optional[int] = None, cursor: Optional[str] = None, limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    posicao = decodificar_cursor(cursor, (int, float)) if cursor else None
+    resultados = await buscar_posts(session, q, limit, autor, posicao)
+    next_cursor = None
+    if len(resultados) > limit:
+        resultados = resultados[:limit]
+        id_post, score = resultados[-1]
+        next_cursor = codificar_cursor(score, id_post)
+    return {
+        'posts': await posts_por_ids(session, [id_post for id_post, _ in resultados]),
+        'next_cursor': next_cursor
+    }
+
+
+# Rota de exportação de todos os posts com as reações (equipe de análise): o arquivo é gerado e enviado aos poucos,
+# em ordem de id_post, cada reação num registro próprio antes do registro do post; para continuar uma exportação
+# interrompida, apos_id recebe o id_post do último registro "post" recebido
+@order_router.get('/exportar')
+async def exportar_posts(formato: str = Query('ndjson', pattern='^(ndjson|csv)$'), gzip: bool = False, apos_id: int = Query(0, ge=0), user: UsuarioAutenticado = Depends(verificar_token)):
+    if user.id_user not in EXPORTACAO_USUARIOS:
+        raise HTTPException(status_code=401, detail='Você não tem autorização para exportar os dados')
+    nome_arquivo = f'posts.{formato}' + ('.gz' if gzip else '')
+    return StreamingResponse(
+        exportar_async(apos_id, formato, gzip),
+        media_type='application/gzip' if gzip else FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'},
+    )
+
+
+# Canal de eventos em tempo real (Server-Sent Events) do usuário logado: posts novos de quem ele segue, posts editados
+# e deletados e as contagens de likes/dislikes atualizadas (no máximo uma mensagem por post a cada intervalo)
+@order_router.get('/eventos')
+async def eventos(user: UsuarioAutenticado = Depends(verificar_token)):
+    hub.verificar_vaga()
+    return StreamingResponse(transmitir(user.id_user), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Rota para seguir um usuário
+@order_router.post('/seguir/{id_user}', response_model=MensagemResposta)
+async def seguir_usuario(id_user: int, session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    await seguir(session, user.id_user, id_user)
+    return {'mensagem': f'Agora você segue o usuário de ID: {id_user}'}
+
+
+# Rota para deixar de seguir um usuário
+@order_router.delete('/deixar_de_seguir/{id_user}', response_model=MensagemResposta)
+async def deixar_de_seguir_usuario(id_user: int, session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    await deixar_de_seguir(session, user.id_user, id_user)
+    return {'mensagem': f'Você deixou de seguir o usuário de ID: {id_user}'}
+
+
 # Rota para editar um post
-@order_router.put('/editar_post/{id_post}')
-async def editar_post(id_post: int, post_data: PostUpdate, session: Session = Depends(pegar_sessao), user: Usuario = Depends(verificar_token)): # parâmetros: ID do post, sessão e token do usuário que logou
-    post = session.query(Postagem).filter(Postagem.id_post==id_post).first() # pegando o post do ID digitado
+@order_router.put('/editar_post/{id_post}', response_model=PostEditado)
+async def editar_post(id_post: int, post_data: PostUpdate, session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)): # parâmetros: ID do post, sessão e token do usuário que logou
+    post = (await session.execute(select(Postagem.id_user).where(Postagem.id_post==id_post))).first() # pegando o dono do post do ID digitado
     if not post:
         raise HTTPException(status_code=400, detail='Post não encontrado') # ID não existe
-    post.text = post_data.text # editando o texto 
     if user.id_user != post.id_user: # caso o ID do usuário logado seja diferente do ID do usuário dono do post
         raise HTTPException(status_code=401, detail='Você não tem autorização para fazer essa modificação') 
-    session.commit() # commitando a mudança feita no banco
-    session.refresh(post) 
+    editado = (await agregador.executar(session, # editando o texto e já recebendo o post atualizado (UPDATE ... RETURNING)
+        update(Postagem).where(Postagem.id_post==id_post).values(text=post_data.text).returning(*colunas_post).execution_options(synchronize_session=False)
+    )).mappings().one()
+    post = post_para_dict(editado) # antes do commit: logo depois da leitura, sem await no meio (ver agregador.executar)
+    await session.commit() # commitando a mudança feita no banco
+    hub.post_editado(post)
     return {
-        'mensagem': f'Post número: {post.id_post} editado com sucesso', # mensagem na API
+        'mensagem': f'Post número: {id_post} editado com sucesso', # mensagem na API
         'post': post
     }
 
 
 # Rota para deletar um post
-@order_router.delete('/deletar_post/{id_post}')
-async def deletar_post(id_post: int, session: Session = Depends(pegar_sessao), user: Usuario = Depends(verificar_token)):
-    post = session.query(Postagem).filter(Postagem.id_post==id_post).first()
+@order_router.delete('/deletar_post/{id_post}', response_model=MensagemResposta)
+async def deletar_post(id_post: int, session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    post = (await session.execute(select(Postagem.id_user).where(Postagem.id_post==id_post))).first()
     if not post:
         raise HTTPException(status_code=400, detail='Post não encontrado')
     if user.id_user != post.id_user:
         raise HTTPException(status_code=401, detail='Você não tem autorização para fazer essa modificação')
-    session.delete(post)
-    session.commit()
+    await session.execute(delete(Reacao).where(Reacao.id_post==id_post).execution_options(synchronize_session=False)) # apagando as reações do post junto com ele
+    await remover_post(session, id_post) # tirando o post dos feeds
+    await session.execute(delete(Postagem).where(Postagem.id_post==id_post).execution_options(synchronize_session=False))
+    await session.commit()
+    tendencias.remover(id_post)
+    hub.post_deletado(id_post)
     return {
         'mensagem': f'Post de ID: {id_post} deletado com sucesso!'
     }
 
 
-# Rota para dar like em um post
-@order_router.post('/like_post/{id_post}')
-async def like_post(id_post: int, session: Session = Depends(pegar_sessao), user: Usuario = Depends(verificar_token)):
-    already_disliked = session.query(DislikePost).filter(DislikePost.id_post==id_post, DislikePost.id_user==user.id_user).first() # verificando se o usuário já deu dislike 
-    if already_disliked: # se sim retira o dislike (só é permitido uma interação por usuário)
-        session.delete(already_disliked) # tirando o usuário na tabela de quem deu dislike no post
-        session.query(Postagem).filter(Postagem.id_post==id_post).update({Postagem.dislikes: Postagem.dislikes - 1}, synchronize_session=False) # diminuindo uma unidade na coluna de dislikes do post
-    already_liked = session.query(LikePost).filter(LikePost.id_post==id_post, LikePost.id_user==user.id_user).first() # verificando se o usuário já deu like na postagem
-    if already_liked: # se sim retira o like
-        session.delete(already_liked) # tirando o usuário na tabela de quem deu like post
-        session.query(Postagem).filter(Postagem.id_post==id_post).update({Postagem.likes: Postagem.likes - 1}, synchronize_session=False) # diminuindo uma unidade na coluna dos likes
-        session.commit() # commitando a mudança no banco
-        return {'mensagem': 'Post descurtido com sucesso!'}
-    else:
-        like = LikePost(id_post=id_post, id_user=user.id_user) # dando like no post
-        session.add(like) # adicionando o like
-
-        try:
-            session.commit() # commitando a mudança
-            session.query(Postagem).filter(Postagem.id_post==id_post).update({Postagem.likes: Postagem.likes + 1}, synchronize_session=False) # adicionando uma unidade na coluna de likes
-            session.commit() # commitando a mudança
-            return {'mensagem': 'Post curtido com sucesso!'}
-        except Exception as e: 
-            session.rollback() # revertendo as mudanças no banco caso ocorra algum erro
-            raise HTTPException(status_code=409, detail=str(e))
-
-
-
-# Rota de dislike em um post
-@order_router.post('/dislike_post/{id_post}')
-async def like_post(id_post: int, session: Session = Depends(pegar_sessao), user: Usuario = Depends(verificar_token)):
-    already_liked = session.query(LikePost).filter(LikePost.id_post==id_post, LikePost.id_user==user.id_user).first() # verificando se o usuário já deu like no post
-    if already_liked: # se sim retira o like (só é permitido uma interação por usuário)
-        session.delete(already_liked) # deletando o usuário na tabela de quem deu like no post
-        session.query(Postagem).filter(Postagem.id_post==id_post).update({Postagem.likes: Postagem.likes - 1}, synchronize_session=False) # diminuindo uma unidade na coluna de likes do post
-    already_disliked = session.query(LikePost).filter(LikePost.id_post==id_post, LikePost.id_user==user.id_user).first() # verificando se o usuário já deu dislike no post
-    if already_disliked: # se sim retira o dislike
-        session.delete(already_disliked) # tirando o usuário da tabela de quem deu dislike no post
-        session.query(Postagem).filter(Postagem.id_post==id_post).update({Postagem.dislikes: Postagem.dislikes - 1}, synchronize_session=False) # diminuindo uma unidade na coluna de dislikes do post
-        session.commit() # commitando a mudança
-        return {'mensagem': 'Dislike desfeito com sucesso!'}
-    else:
-        dislike = LikePost(id_post=id_post, id_user=user.id_user) # dando dislike no post
-        session.add(dislike) # adicionando o dislike
-
-        try:
-            session.commit() # commitando a mudanla
-            session.query(Postagem).filter(Postagem.id_post==id_post).update({Postagem.dislikes: Postagem.dislikes + 1}, synchronize_session=False) # adicionando uma unidade na coluna de dislikes do post
-            session.commit() # commitando a mudança
-            return {'mensagem': 'Dislike feito com sucesso!'}
-        except Exception as e:
-            session.rollback() # desfazendo as mudanças no banco caso ocorra algum erro
-            raise HTTPException(status_code=409, detail=str(e))
+# Rota para dar like em um post (se já curtiu, desfaz o like; se tinha dado dislike, troca)
+@order_router.post('/like_post/{id_post}', response_model=ReacaoResposta)
+async def like_post(id_post: int, session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    anterior, atual = await aplicar_reacao(session, id_post, user.id_user, LIKE)
+    hub.contadores_alterados(id_post)
+    if atual == LIKE:
+        return {'mensagem': 'Post curtido com sucesso!', 'reacao': NOMES[LIKE]}
+    return {'mensagem': 'Post descurtido com sucesso!', 'reacao': None}
+
+
+# Rota de dislike em um post (se já deu dislike, desfaz; se tinha curtido, troca)
+@order_router.post('/dislike_post/{id_post}', response_model=ReacaoResposta)
+async def dislike_post(id_post: int, session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    anterior, atual = await aplicar_reacao(session, id_post, user.id_user, DISLIKE)
+    hub.contadores_alterados(id_post)
+    if atual == DISLIKE:
+        return {'mensagem': 'Dislike feito com sucesso!', 'reacao': NOMES[DISLIKE]}
+    return {'mensagem': 'Dislike desfeito com sucesso!', 'reacao': None}
 
 
+# Rota de manutenção que reconstrói os likes/dislikes de todos os posts a partir das reações (só para CONTADORES_USUARIOS)
+@order_router.post('/reconstruir_contadores', response_model=MensagemResposta)
+async def reconstruir_contadores(user: UsuarioAutenticado = Depends(verificar_token)):
+    if user.id_user not in CONTADORES_USUARIOS:
+        raise HTTPException(status_code=401, detail='Você não tem autorização para reconstruir os contadores')
+    corrigidos = await agregador.reconstruir()
+    return {'mensagem': f'{corrigidos} post(s) com contadores corrigidos'}
+
+
+# Rota que devolve a reação do usuário logado em uma página inteira de posts (ex: /order/reacoes?ids=1&ids=2)
+@order_router.get('/reacoes', response_model=ReacoesResposta)
+async def listar_reacoes(ids: List[int] = Query(..., max_length=LIMITE_MAXIMO), session: AsyncSession = Depends(pegar_sessao), user: UsuarioAutenticado = Depends(verificar_token)):
+    return {
+        'reacoes': await reacoes_do_usuario(session, user.id_user, ids)
+    }
@@ -0,0 +1,24 @@
+from fastapi import HTTPException
+import base64
+import json
+
+LIMITE_PADRAO = 20 # quantidade de postagens por página quando o cliente não informa o limite
+LIMITE_MAXIMO = 100 # maior página que o cliente pode pedir
+
+
+# Função para codificar o cursor (token opaco com a chave de ordenação e o ID do último post da página)
+def codificar_cursor(chave, id_post):
+    dados = json.dumps([chave, id_post], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(dados).decode().rstrip('=')
+
+
+# Função para decodificar o cursor enviado pelo cliente (tipo_chave: tipo esperado da chave de ordenação, ex: a data crua)
+def decodificar_cursor(cursor, tipo_chave=str):
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        chave, id_post = json.loads(dados)
+        if not isinstance(chave, tipo_chave) or not isinstance(id_post, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Cursor inválido')
+    return chave, id_post
@@ -0,0 +1,58 @@
+from fastapi import HTTPException
+from sqlalchemy import DateTime, select, insert, delete, literal
+from datetime import datetime, timezone
+from models import Postagem, Reacao
+from contadores import agregador
+from tendencias import tendencias
+
+LIKE = 1
+DISLIKE = -1
+NOMES = {LIKE: 'like', DISLIKE: 'dislike'} # nome de cada tipo de reação nas respostas da API
+
+
+# Função que aplica uma reação (like ou dislike) de um usuário em um post, em uma única transação:
+# - sem reação anterior: cria a reação
+# - mesma reação: desfaz (toggle)
+# - reação oposta: troca
+# O DELETE ... RETURNING pega o lock de escrita do SQLite logo no começo, então cliques simultâneos do mesmo
+# usuário são serializados. Os contadores do post não são atualizados aqui: a diferença vai para o agregador
+# (write-behind), que grava em lote, e também para o ranking de posts em alta (a reação desfeita sai do ranking com o peso
+# da hora em que foi feita, devolvida pelo DELETE ... RETURNING). Retorna (reação anterior, reação atual).
+async def aplicar_reacao(session, id_post, id_user, tipo):
+    async with agregador.escrita(): # a reconstrução dos contadores não pode rodar entre o commit e o registrar
+        removida = (await session.execute(
+            delete(Reacao).where(Reacao.id_post==id_post, Reacao.id_user==id_user).returning(Reacao.tipo, Reacao.date_time).execution_options(synchronize_session=False)
+        )).first()
+        anterior, data_anterior = removida if removida else (None, None)
+        atual = None if anterior == tipo else tipo
+        agora = datetime.now(timezone.utc)
+        if atual is not None:
+            # o INSERT ... SELECT só grava se o post existir, sem precisar de uma consulta a mais
+            resultado = await session.execute(
+                insert(Reacao).from_select(
+                    ['id_post', 'id_user', 'tipo', 'date_time'],
+                    select(Postagem.id_post, literal(id_user), literal(atual), literal(agora.replace(tzinfo=None), DateTime)).where(Postagem.id_post==id_post), # o banco guarda em UTC
+                )
+            )
+            if resultado.rowcount == 0: # o post não existe: nada do que foi feito acima vale
+                await session.rollback()
+                raise HTTPException(status_code=400, detail='Post não encontrado')
+        await session.commit()
+        likes, dislikes = (atual == LIKE) - (anterior == LIKE), (atual == DISLIKE) - (anterior == DISLIKE)
+        agregador.registrar(id_post, likes, dislikes)
+        if anterior is not None and data_anterior is not None:
+            tendencias.reacao(id_post, -(anterior == LIKE), -(anterior == DISLIKE), data_anterior.replace(tzinfo=timezone.utc).timestamp())
+        if atual is not None:
+            tendencias.reacao(id_post, atual == LIKE, atual == DISLIKE, agora.timestamp())
+    return anterior, atual
+
+
+# Função que devolve a reação do usuário em vários posts de uma vez (uma consulta só pela chave primária)
+async def reacoes_do_usuario(session, id_user, ids_posts):
+    linhas = await session.execute(
+        select(Reacao.id_post, Reacao.tipo).where(Reacao.id_user==id_user, Reacao.id_post.in_(ids_posts))
+    )
+    estado = {id_post: None for id_post in ids_posts}
+    for id_post, tipo in linhas:
+        estado[id_post] = NOMES[tipo]
+    return estado
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
+from datetime import datetime
 
 # Esse arquivo foi criado para padronizar os dados tanto do cadastro de usuários quanto dos de uma postagem
 
@@ -13,6 +14,16 @@ class UsuarioSchema(BaseModel):
     class Config:
         from_attributes = True
 
+# dados do usuário autenticado que ficam guardados no cache e chegam nas rotas (sem a senha)
+class UsuarioAutenticado(BaseModel):
+    id_user: int
+    username: str
+    email: str
+    activity: bool
+
+    class Config:
+        from_attributes = True
+
 # criando a base de dados que devem ser preenchidos na hora de criar um post
 class PostSchema(BaseModel):
     id_user: int
@@ -22,6 +33,10 @@ class PostSchema(BaseModel):
     class Config:
         from_attributes = True
 
+# post recebido na carga em lote (a data é opcional: posts migrados de outro sistema mantêm a data original)
+class PostLoteSchema(PostSchema):
+    date_time: Optional[datetime] = None
+
 
 # criando a base de dados que devem ser preenchidos na hora de logar
 class LoginSchema(BaseModel):
@@ -29,4 +44,74 @@ class LoginSchema(BaseModel):
     password: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# Modelos das respostas da API: só os campos que o cliente deve ver (a senha nunca entra) e serializados direto pelo pydantic-core
+
+# post devolvido pelas rotas (montado a partir das colunas selecionadas, sem carregar o objeto do ORM)
+class PostResposta(BaseModel):
+    id_post: int
+    id_user: int
+    username: str
+    text: str
+    date_time: Optional[datetime]
+    likes: int
+    dislikes: int
+
+
+# página de posts (listagem, feed e busca)
+class PaginaPosts(BaseModel):
+    posts: List[PostResposta]
+    next_cursor: Optional[str] = None # None quando não existem mais postagens
+
+
+# página de posts do usuário logado
+class PaginaPostsUsuario(BaseModel):
+    user: UsuarioAutenticado
+    posts: List[PostResposta]
+    next_cursor: Optional[str] = None
+
+
+# post em alta, com a pontuação atual no ranking
+class PostTendencia(PostResposta):
+    pontuacao: float
+
+
+# posts em alta (do mais para o menos pontuado)
+class TendenciasResposta(BaseModel):
+    posts: List[PostTendencia]
+
+
+# resposta das rotas que só devolvem uma mensagem
+class MensagemResposta(BaseModel):
+    mensagem: str
+
+
+# resposta da edição de um post
+class PostEditado(MensagemResposta):
+    post: PostResposta
+
+
+# resposta do like/dislike
+class ReacaoResposta(MensagemResposta):
+    reacao: Optional[str]
+
+
+# reação do usuário logado em cada post pedido
+class ReacoesResposta(BaseModel):
+    reacoes: Dict[int, Optional[str]]
+
+
+# registro recusado na carga em lote (índice = posição do registro no corpo enviado, começando em 0)
+class ErroRegistro(BaseModel):
+    indice: int
+    erro: str
+
+
+# resultado da carga em lote
+class LoteResposta(BaseModel):
+    recebidos: int
+    inseridos: int
+    rejeitados: int
+    erros: List[ErroRegistro] # só os primeiros erros (ver INGESTAO_MAX_ERROS)
@@ -0,0 +1,88 @@
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from main import bcrypt_context
+import asyncio
+import os
+import threading
+import time
+
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1)))) # threads dedicadas ao bcrypt
+BCRYPT_MAX_FILA = int(os.getenv('BCRYPT_MAX_FILA', '32')) # máximo de hashes esperando ou rodando antes de recusar com 503
+
+
+# Pool limitado de threads para o bcrypt: cada hash/verificação gasta de 100 a 300 ms de CPU,
+# então roda fora do event loop para as outras rotas continuarem sendo atendidas
+class PoolSenhas:
+    def __init__(self, workers, max_fila):
+        self.max_fila = max_fila
+        self._executor = None # criado na subida da API (iniciar) e desfeito na parada (fechar)
+        self.workers = workers
+        self.pendentes = 0 # operações na fila ou rodando
+        self.recusadas = 0 # operações recusadas por fila cheia
+        self.duracoes = {'hash': deque(maxlen=1000), 'verify': deque(maxlen=1000)} # últimos tempos de cada operação (segundos)
+        self.contagem = {'hash': 0, 'verify': 0}
+        self.soma = {'hash': 0.0, 'verify': 0.0}
+        self._lock = threading.Lock() # os tempos são gravados pelas threads do pool
+
+    # Função que roda a operação no pool e mede só o tempo gasto no bcrypt (sem a espera na fila)
+    def _medir(self, operacao, funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._lock:
+                self.duracoes[operacao].append(duracao)
+                self.contagem[operacao] += 1
+                self.soma[operacao] += duracao
+
+    async def _executar(self, operacao, funcao, *args):
+        if self._executor is None: # API parando (ou ainda não iniciada)
+            raise HTTPException(status_code=503, detail='Servidor indisponível, tente novamente em instantes', headers={'Retry-After': '1'})
+        if self.pendentes >= self.max_fila: # fila cheia: melhor recusar agora do que deixar as requisições acumulando
+            self.recusadas += 1
+            raise HTTPException(status_code=503, detail='Servidor ocupado, tente novamente em instantes', headers={'Retry-After': '1'})
+        self.pendentes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._medir, operacao, funcao, *args)
+        finally:
+            self.pendentes -= 1
+
+    # Função para criptografar uma senha
+    async def gerar_hash(self, senha):
+        return await self._executar('hash', bcrypt_context.hash, senha)
+
+    # Função para conferir uma senha com o hash guardado no banco
+    async def verificar(self, senha, hash_senha):
+        return await self._executar('verify', bcrypt_context.verify, senha, hash_senha)
+
+    # Função que devolve os tempos do bcrypt, usada para ajustar o custo (rounds) contra a vazão de logins
+    def estatisticas(self):
+        resultado = {'workers': self.workers, 'max_fila': self.max_fila, 'pendentes': self.pendentes, 'recusadas': self.recusadas}
+        for operacao, duracoes in self.duracoes.items():
+            with self._lock:
+                ordenadas = sorted(duracoes)
+            resultado[operacao] = {
+                'contagem': self.contagem[operacao],
+                'media_ms': 1000 * self.soma[operacao] / self.contagem[operacao] if self.contagem[operacao] else 0.0,
+                'p50_ms': 1000 * ordenadas[len(ordenadas) // 2] if ordenadas else 0.0,
+                'p95_ms': 1000 * ordenadas[int(len(ordenadas) * 0.95)] if ordenadas else 0.0,
+                'max_ms': 1000 * ordenadas[-1] if ordenadas else 0.0,
+            }
+        return resultado
+
+    # Função chamada na subida da API
+    def iniciar(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+
+    # Função chamada na parada da API: espera os hashes em andamento terminarem
+    def fechar(self):
+        executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+
+pool_senhas = PoolSenhas(BCRYPT_WORKERS, BCRYPT_MAX_FILA)
@@ -0,0 +1,118 @@
+from sqlalchemy import select
+from datetime import timezone
+from models import Postagem, Reacao, SessaoAsync
+import heapq
+import math
+import os
+import time
+
+TENDENCIAS_MEIA_VIDA = float(os.getenv('TENDENCIAS_MEIA_VIDA', str(6 * 3600))) # segundos para o peso de uma interação cair pela metade
+TENDENCIAS_PESO_POST = float(os.getenv('TENDENCIAS_PESO_POST', '1.0')) # pontos de um post recém-criado
+TENDENCIAS_PESO_LIKE = float(os.getenv('TENDENCIAS_PESO_LIKE', '1.0')) # pontos de cada like
+TENDENCIAS_PESO_DISLIKE = float(os.getenv('TENDENCIAS_PESO_DISLIKE', '-0.5')) # pontos de cada dislike
+TENDENCIAS_MINIMO = float(os.getenv('TENDENCIAS_MINIMO', '0.01')) # posts abaixo disso (já com o decaimento) saem do ranking
+TENDENCIAS_AQUECIMENTO = int(os.getenv('TENDENCIAS_AQUECIMENTO', '10000')) # posts recentes carregados na subida da API
+
+
+# Ranking dos posts em alta, atualizado a cada evento (post novo, like, dislike, post deletado) sem varrer a tabela.
+# Pontuação com decaimento exponencial: uma interação no instante t vale peso * 2^(-(agora - t) / meia_vida).
+# Em vez de diminuir todas as pontuações com o passar do tempo, cada interação é somada já multiplicada por
+# e^(λ(t - t0)), que cresce com o tempo: a ordem entre os posts é a mesma e nada precisa ser recalculado.
+# A cada meia-vida as pontuações são divididas pelo fator acumulado (t0 volta para agora), o que evita números enormes
+# e tira do ranking os posts que já esfriaram. O top N sai de um heap com remoção preguiçosa (entradas antigas de um
+# post são ignoradas quando aparecem no topo), então cada atualização e cada consulta custam O(log n).
+class RankingTendencias:
+    def __init__(self, meia_vida, minimo):
+        self.taxa = math.log(2) / meia_vida # λ
+        self.meia_vida = meia_vida
+        self.minimo = minimo
+        self.t0 = time.time()
+        self.pontuacoes = {} # id_post -> pontuação na escala de t0
+        self._heap = [] # (-pontuação, id_post), pode ter entradas desatualizadas
+
+    def _peso(self, momento):
+        return math.exp(self.taxa * (momento - self.t0))
+
+    # Função que divide as pontuações pelo fator acumulado desde t0 e descarta os posts que esfriaram
+    def _rebasear(self, agora):
+        fator = self._peso(agora)
+        self.pontuacoes = {id_post: pontuacao / fator for id_post, pontuacao in self.pontuacoes.items() if pontuacao / fator >= self.minimo}
+        self.t0 = agora
+        self._reconstruir()
+
+    def _reconstruir(self):
+        self._heap = [(-pontuacao, id_post) for id_post, pontuacao in self.pontuacoes.items()]
+        heapq.heapify(self._heap)
+
+    def _agora(self):
+        agora = time.time()
+        if agora - self.t0 > self.meia_vida:
+            self._rebasear(agora)
+        return agora
+
+    # Função que soma pontos a um post (momento: quando a interação aconteceu; padrão: agora)
+    def somar(self, id_post, pontos, momento=None):
+        agora = self._agora()
+        if not pontos:
+            return
+        if pontos < 0 and id_post not in self.pontuacoes: # reação desfeita de um post que já saiu do ranking (esfriou ou é antigo)
+            return
+        pontuacao = self.pontuacoes.get(id_post, 0.0) + pontos * self._peso(agora if momento is None else momento)
+        self.pontuacoes[id_post] = pontuacao
+        heapq.heappush(self._heap, (-pontuacao, id_post))
+        if len(self._heap) > 2 * len(self.pontuacoes) + 64: # muitas entradas desatualizadas: reconstruindo
+            self._reconstruir()
+
+    def post_criado(self, id_post, momento=None):
+        self.somar(id_post, TENDENCIAS_PESO_POST, momento)
+
+    # Função chamada a cada reação feita (likes/dislikes = +1) ou desfeita (-1, com o momento em que tinha sido feita,
+    # para tirar exatamente o peso que ela somou; com o peso de agora, desfazer deixaria o post com pontuação negativa)
+    def reacao(self, id_post, likes, dislikes, momento=None):
+        self.somar(id_post, likes * TENDENCIAS_PESO_LIKE + dislikes * TENDENCIAS_PESO_DISLIKE, momento)
+
+    def remover(self, id_post):
+        self.pontuacoes.pop(id_post, None) # a entrada no heap fica e é ignorada quando chegar ao topo
+
+    # Função que devolve os N posts com maior pontuação agora: [(id_post, pontuação)]
+    def top(self, limite):
+        agora = self._agora()
+        validos = []
+        vistos = set()
+        while self._heap and len(validos) < limite:
+            negativo, id_post = heapq.heappop(self._heap)
+            if self.pontuacoes.get(id_post) == -negativo and id_post not in vistos: # entrada atual do post
+                validos.append((id_post, -negativo))
+                vistos.add(id_post)
+        for id_post, pontuacao in validos: # devolvendo ao heap (as desatualizadas ficam de fora de vez)
+            heapq.heappush(self._heap, (-pontuacao, id_post))
+        fator = self._peso(agora)
+        return [(id_post, pontuacao / fator) for id_post, pontuacao in validos]
+
+    # Função chamada na subida da API: carrega os posts mais recentes e as reações deles, cada uma com o peso da hora em que foi feita
+    async def aquecer(self, quantidade=TENDENCIAS_AQUECIMENTO):
+        self.t0 = time.time()
+        self.pontuacoes = {}
+        recentes = (
+            select(Postagem.id_post)
+            .where(Postagem.date_time.is_not(None))
+            .order_by(Postagem.date_time.desc(), Postagem.id_post.desc())
+            .limit(quantidade)
+        )
+        async with SessaoAsync() as session:
+            posts = await session.execute(select(Postagem.id_post, Postagem.date_time).where(Postagem.id_post.in_(recentes)))
+            for id_post, date_time in posts:
+                self.pontuacoes[id_post] = TENDENCIAS_PESO_POST * self._peso(date_time.replace(tzinfo=timezone.utc).timestamp()) # o banco guarda em UTC
+            reacoes = await session.stream( # pela chave primária (id_post, id_user), lidas aos poucos
+                select(Reacao.id_post, Reacao.tipo, Reacao.date_time).where(Reacao.id_post.in_(recentes), Reacao.date_time.is_not(None)).execution_options(yield_per=10000)
+            )
+            async for id_post, tipo, date_time in reacoes:
+                if id_post not in self.pontuacoes:
+                    continue
+                pontos = TENDENCIAS_PESO_LIKE if tipo > 0 else TENDENCIAS_PESO_DISLIKE
+                self.pontuacoes[id_post] += pontos * self._peso(date_time.replace(tzinfo=timezone.utc).timestamp())
+        self.pontuacoes = {id_post: pontuacao for id_post, pontuacao in self.pontuacoes.items() if pontuacao >= self.minimo}
+        self._reconstruir()
+
+
+tendencias = RankingTendencias(TENDENCIAS_MEIA_VIDA, TENDENCIAS_MINIMO)
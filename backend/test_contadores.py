@@ -0,0 +1,88 @@
+import asyncio
+import sqlite3
+
+# Teste da reconstrução dos contadores com a API rodando: a reconstrução tem que gravar antes as diferenças que
+# estão na memória do agregador (senão elas seriam somadas de novo por cima da contagem real) e não pode rodar
+# entre o commit de uma reação e o registrar dela.
+# uso: python -m pytest test_contadores.py
+
+from contadores import agregador, verificar_contadores
+from models import db, db_async
+
+
+# Função que cria um usuário com um post e um like já gravado em Reacoes, com o contador do post ainda em 0
+# (como se a diferença ainda estivesse só na memória do agregador). Devolve o id do post
+def criar_post_curtido(banco):
+    with sqlite3.connect(banco) as conexao:
+        id_user = conexao.execute('INSERT INTO "Usuarios" (username, email, password) VALUES (\'contador\', \'contador@exemplo.com\', \'x\')').lastrowid
+        id_post = conexao.execute('INSERT INTO "Postagens" (id_user, user, text, likes, dislikes) VALUES (?, \'contador\', \'post do contador\', 0, 0)', (id_user,)).lastrowid
+    return id_user, id_post
+
+
+def curtir(banco, id_post, id_user):
+    with sqlite3.connect(banco) as conexao:
+        conexao.execute('INSERT INTO "Reacoes" (id_post, id_user, tipo) VALUES (?, ?, 1)', (id_post, id_user))
+
+
+def contadores(banco, id_post):
+    with sqlite3.connect(banco) as conexao:
+        return conexao.execute('SELECT likes, dislikes FROM "Postagens" WHERE id_post = ?', (id_post,)).fetchone()
+
+
+# Função que apaga o que o teste criou (os outros testes usam o mesmo banco)
+def apagar(banco, id_user, id_post):
+    with sqlite3.connect(banco) as conexao:
+        conexao.execute('DELETE FROM "Reacoes" WHERE id_post = ?', (id_post,))
+        conexao.execute('DELETE FROM "Postagens" WHERE id_post = ?', (id_post,))
+        conexao.execute('DELETE FROM "Usuarios" WHERE id_user = ?', (id_user,))
+
+
+# Função que roda o cenário com o agregador ligado, como na subida da API
+def rodar(cenario):
+    async def principal():
+        agregador.iniciar()
+        try:
+            return await cenario()
+        finally:
+            await agregador.parar()
+            await db_async.dispose()
+    return asyncio.run(principal())
+
+
+def test_reconstruir_grava_as_pendentes_antes(banco):
+    id_user, id_post = criar_post_curtido(banco)
+    try:
+        curtir(banco, id_post, id_user)
+
+        async def cenario():
+            agregador.registrar(id_post, 1, 0) # o like já está em Reacoes e a diferença dele só na memória
+            await agregador.reconstruir()
+            assert not agregador.pendentes and not agregador.em_voo
+            assert contadores(banco, id_post) == (1, 0)
+            await agregador.descarregar() # nada pode sobrar para ser somado de novo
+            assert contadores(banco, id_post) == (1, 0)
+
+        rodar(cenario)
+        with db.connect() as conexao:
+            assert verificar_contadores(conexao) == 0
+    finally:
+        apagar(banco, id_user, id_post)
+
+
+def test_reconstruir_espera_a_reacao_em_andamento(banco):
+    id_user, id_post = criar_post_curtido(banco)
+    try:
+        async def cenario():
+            async with agregador.escrita(): # reação entre o commit e o registrar
+                curtir(banco, id_post, id_user)
+                reconstrucao = asyncio.create_task(agregador.reconstruir())
+                await asyncio.sleep(0.2)
+                assert not reconstrucao.done()
+                agregador.registrar(id_post, 1, 0)
+            await reconstrucao
+            await agregador.descarregar()
+            assert contadores(banco, id_post) == (1, 0)
+
+        rodar(cenario)
+    finally:
+        apagar(banco, id_user, id_post)
@@ -0,0 +1,143 @@
+import re
+import sqlite3
+
+import pytest
+
+# Teste dos planos de consulta: sobe a API com um banco temporário (com todas as migrations),
+# chama as rotas quentes de order_routes.py e auth_routes.py (que passam por dependencies.py), guarda cada SQL
+# executado e roda EXPLAIN QUERY PLAN nele. Falha se alguma consulta voltou a ler uma tabela inteira,
+# a ordenar o feed em memória ou se uma consulta quente deixou de usar o índice dela.
+# uso: python -m pytest test_planos.py
+
+# (o banco temporário e as variáveis de ambiente ficam no conftest.py)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import timeline
+from cache import cache_usuarios
+from main import app
+from models import db_async
+
+# índice que cada rota quente tem que usar (o nome aparece no plano como "USING [COVERING] INDEX nome")
+INDICES_ESPERADOS = [
+    ('GET /order/listar_posts', 'ix_postagens_data'),
+    ('GET /order/listar_posts_user/', 'ix_postagens_usuario_data'),
+    ('GET /order/feed', 'ix_timelines_user_data'),
+    ('GET /order/feed', 'ix_postagens_usuario_data'), # fan-out na leitura
+    ('POST /auth/criar_conta', 'ix_usuarios_email'),
+    ('POST /order/postar', 'ix_seguidores_seguido'),
+    ('DELETE /order/deletar_post/1', 'ix_timelines_post'),
+]
+
+consultas = {} # (rota que executou, SQL) -> parâmetros
+rota_atual = None
+
+
+@event.listens_for(db_async.sync_engine, 'before_cursor_execute')
+def guardar_consulta(conexao, cursor, sql, parametros, contexto, executemany):
+    if rota_atual is not None and sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+        if executemany and isinstance(parametros[0], (tuple, list, dict)): # nos INSERTs em blocos de VALUES os parâmetros já chegam achatados
+            parametros = parametros[0]
+        consultas.setdefault((rota_atual, sql), parametros)
+
+
+# Função que chama uma rota guardando o nome dela para o relatório (o cache é limpo para a consulta do token aparecer)
+def chamar(cliente, metodo, caminho, **kwargs):
+    global rota_atual
+    rota_atual = f'{metodo.upper()} {caminho}'
+    cache_usuarios.limpar()
+    resposta = cliente.request(metodo, caminho, **kwargs)
+    if resposta.status_code >= 500:
+        raise RuntimeError(f'{rota_atual} respondeu {resposta.status_code}')
+    return resposta
+
+
+# Função que roda as rotas quentes com alguns dados de exemplo
+def exercitar_rotas():
+    global rota_atual
+    with pytest.MonkeyPatch.context() as alterar, TestClient(app) as cliente:
+        alterar.setattr(timeline, 'FANOUT_LIMIAR', 2) # força o caminho de fan-out na leitura do feed
+        tokens = {}
+        for nome in ('ana', 'bia', 'caio', 'davi'):
+            chamar(cliente, 'post', '/auth/criar_conta', json={'username': nome, 'email': f'{nome}@exemplo.com', 'password': 'senha', 'activity': True})
+            token = chamar(cliente, 'post', '/auth/login', json={'username': nome, 'password': 'senha'}).json()['access_token']
+            tokens[nome] = {'Authorization': f'Bearer {token}'}
+        chamar(cliente, 'post', '/auth/login-form', data={'username': 'ana', 'password': 'senha'})
+        chamar(cliente, 'get', '/auth/refresh', headers=tokens['ana'])
+        for seguidor in ('bia', 'caio', 'davi'):
+            chamar(cliente, 'post', '/order/seguir/1', headers=tokens[seguidor])
+        chamar(cliente, 'post', '/order/seguir/2', headers=tokens['caio'])
+        for numero in range(30):
+            chamar(cliente, 'post', '/order/postar', json={'id_user': 1 + numero % 2, 'username': ('ana', 'bia')[numero % 2], 'text': f'post número {numero} sobre café'}, headers=tokens['ana'])
+        chamar(cliente, 'post', '/order/postar_lote', content='\n'.join(f'{{"id_user": 2, "username": "bia", "text": "lote {numero}"}}' for numero in range(10)), headers=tokens['bia'])
+        cursor = chamar(cliente, 'get', '/order/listar_posts', params={'limit': 5}, headers=tokens['caio']).json()['next_cursor']
+        chamar(cliente, 'get', '/order/listar_posts', params={'limit': 5, 'cursor': cursor}, headers=tokens['caio'])
+        cursor = chamar(cliente, 'get', '/order/listar_posts_user/', params={'limit': 5}, headers=tokens['ana']).json()['next_cursor']
+        chamar(cliente, 'get', '/order/listar_posts_user/', params={'limit': 5, 'cursor': cursor}, headers=tokens['ana'])
+        cursor = chamar(cliente, 'get', '/order/feed', params={'limit': 5}, headers=tokens['caio']).json()['next_cursor']
+        chamar(cliente, 'get', '/order/feed', params={'limit': 5, 'cursor': cursor}, headers=tokens['caio'])
+        chamar(cliente, 'get', '/order/buscar', params={'q': 'café', 'limit': 5}, headers=tokens['caio'])
+        chamar(cliente, 'get', '/order/buscar', params={'q': 'café', 'autor': 1, 'limit': 5}, headers=tokens['caio'])
+        chamar(cliente, 'post', '/order/like_post/3', headers=tokens['caio'])
+        chamar(cliente, 'post', '/order/dislike_post/3', headers=tokens['caio'])
+        chamar(cliente, 'post', '/order/dislike_post/3', headers=tokens['caio'])
+        chamar(cliente, 'get', '/order/trending', params={'limit': 5}, headers=tokens['caio'])
+        chamar(cliente, 'get', '/order/reacoes', params={'ids': [1, 2, 3]}, headers=tokens['caio'])
+        chamar(cliente, 'get', '/order/exportar', params={'apos_id': 2}, headers=tokens['ana'])
+        chamar(cliente, 'put', '/order/editar_post/1', json={'text': 'editado'}, headers=tokens['ana'])
+        chamar(cliente, 'delete', '/order/deletar_post/1', headers=tokens['ana'])
+        chamar(cliente, 'delete', '/order/deixar_de_seguir/1', headers=tokens['caio'])
+        rota_atual = 'gravação dos contadores'
+    # a gravação dos contadores pendentes acontece na parada da API (saída do TestClient)
+    rota_atual = None # consultas dos outros testes não entram no relatório
+
+
+# Função que devolve os problemas encontrados no plano de uma consulta
+def problemas_do_plano(sql, plano):
+    filtro_igualdade = re.search(r'\bWHERE\b.*[^<>!]=', ' '.join(sql.split()), re.IGNORECASE)
+    problemas = []
+    for linha in plano:
+        detalhe = linha[-1]
+        if detalhe.startswith('SCAN '):
+            nome = detalhe.split()[1]
+            if nome.startswith('(') or nome.startswith('anon_') or 'VIRTUAL TABLE' in detalhe or 'CONSTANT ROW' in detalhe:
+                continue # subconsulta já limitada, índice FTS5 / json_each ou a lista de VALUES de um INSERT em lote
+            if 'USING' in detalhe and 'INDEX' in detalhe and 'LIMIT' in sql.upper() and not filtro_igualdade:
+                continue # percorre o índice na ordem certa e para no LIMIT (com um filtro de igualdade, o índice certo faria SEARCH)
+            problemas.append(detalhe)
+        elif 'USE TEMP B-TREE FOR ORDER BY' in detalhe and '_fts' not in sql:
+            problemas.append(detalhe) # a ordenação por relevância da busca é a única que pode ser feita em memória
+    return problemas
+
+
+# Fixture que roda as rotas uma vez e devolve [(rota, SQL, plano)] de cada consulta executada
+@pytest.fixture(scope='module')
+def planos(banco):
+    exercitar_rotas()
+    conexao = sqlite3.connect(banco)
+    resultado = [(rota, sql, conexao.execute('EXPLAIN QUERY PLAN ' + sql, parametros).fetchall()) for (rota, sql), parametros in consultas.items()]
+    conexao.close()
+    return resultado
+
+
+def test_nenhuma_consulta_le_tabela_inteira(planos):
+    falhas = []
+    for rota, sql, plano in planos:
+        if problemas_do_plano(sql, plano):
+            falhas.append(f'[{rota}] {" ".join(sql.split())}\n' + '\n'.join(f'    {linha[-1]}' for linha in plano))
+    assert not falhas, f'{len(falhas)} consulta(s) com leitura de tabela inteira ou ordenação em memória:\n' + '\n'.join(falhas)
+
+
+@pytest.mark.parametrize('rota, indice', INDICES_ESPERADOS)
+def test_rota_quente_usa_o_indice(planos, rota, indice):
+    detalhes = [linha[-1] for rota_consulta, _, plano in planos if rota_consulta == rota for linha in plano]
+    assert detalhes, f'nenhuma consulta de {rota} foi executada'
+    assert any(re.search(rf'USING (COVERING )?INDEX {indice}\b', detalhe) for detalhe in detalhes), f'{rota} não usa {indice}:\n' + '\n'.join(detalhes)
+
+
+# percorrer o índice global filtrando por usuário (índice do usuário apagado) é leitura da tabela inteira, mesmo com LIMIT
+def test_scan_de_indice_com_filtro_de_igualdade_falha():
+    sql = 'SELECT id_post FROM "Postagens" WHERE "Postagens".id_user = ? ORDER BY date_time DESC, id_post DESC LIMIT ? OFFSET ?'
+    assert problemas_do_plano(sql, [(2, 0, 0, 'SCAN Postagens USING INDEX ix_postagens_data')])
+    assert not problemas_do_plano(sql.replace('WHERE "Postagens".id_user = ? ', ''), [(2, 0, 0, 'SCAN Postagens USING INDEX ix_postagens_data')])
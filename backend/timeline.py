@@ -0,0 +1,151 @@
+from fastapi import HTTPException
+from sqlalchemy import select, delete, update, literal, or_, text
+from sqlalchemy.dialects.sqlite import insert
+from models import Postagem, Usuario, Seguidor, EntradaTimeline
+import json
+import os
+
+FANOUT_LIMIAR = int(os.getenv('FANOUT_LIMIAR', '5000')) # ao chegar a quantos seguidores os posts do usuário passam a ser lidos no feed (fan-out na leitura)
+TIMELINE_BACKFILL = int(os.getenv('TIMELINE_BACKFILL', '50')) # quantos posts recentes entram no feed ao seguir alguém
+
+
+# fan-out na escrita: um único INSERT ... SELECT coloca o post novo no feed do autor e de todos os seguidores dele
+# (os seguidores só recebem se o autor não estiver marcado com fanout_leitura; nesse caso o post é buscado na leitura).
+# A marca é guardada no usuário e nunca volta atrás: se o modo seguisse a contagem de seguidores, os posts feitos
+# acima do limiar sumiriam dos feeds quando o autor voltasse para baixo dele (não estão nas timelines)
+DISTRIBUIR_POST = text('''
+    INSERT OR IGNORE INTO "Timelines" (id_user, id_post, date_time)
+    SELECT p.id_user, p.id_post, p.date_time FROM "Postagens" p WHERE p.id_post = :id_post
+    UNION ALL
+    SELECT s.id_seguidor, p.id_post, p.date_time
+    FROM "Postagens" p
+    JOIN "Usuarios" u ON u.id_user = p.id_user AND NOT u.fanout_leitura
+    JOIN "Seguidores" s ON s.id_seguido = p.id_user
+    WHERE p.id_post = :id_post
+''')
+
+# mesma distribuição para vários posts de uma vez (carga em lote): os IDs chegam como um array JSON e são lidos com json_each
+DISTRIBUIR_POSTS = text('''
+    INSERT OR IGNORE INTO "Timelines" (id_user, id_post, date_time)
+    SELECT p.id_user, p.id_post, p.date_time FROM "Postagens" p WHERE p.id_post IN (SELECT value FROM json_each(:ids))
+    UNION ALL
+    SELECT s.id_seguidor, p.id_post, p.date_time
+    FROM "Postagens" p
+    JOIN "Usuarios" u ON u.id_user = p.id_user AND NOT u.fanout_leitura
+    JOIN "Seguidores" s ON s.id_seguido = p.id_user
+    WHERE p.id_post IN (SELECT value FROM json_each(:ids))
+''')
+
+
+# leitura de uma página do feed (a ordenação final e a remoção de repetidos ficam no Python, em no máximo
+# (usuários com fanout_leitura seguidos + 1) * limite linhas, mais os empates na data de corte):
+# - parte materializada: leitura em intervalo no índice (id_user, date_time, id_post) de Timelines
+# - usuários seguidos marcados com fanout_leitura (fan-out na leitura): para cada um, a subconsulta correlacionada acha
+#   a data do :limite-ésimo post depois do cursor e a leitura em intervalo no índice (id_user, date_time, id_post) de
+#   Postagens para nela (sem post suficiente, lê os que tiver). O CROSS JOIN fixa a ordem das tabelas no SQLite
+#   (seguidos do usuário -> marca do seguido -> posts dele); sem ele o planejador pode começar por Postagens
+LER_FEED = '''
+    SELECT * FROM (
+        SELECT t.date_time, t.id_post FROM "Timelines" t
+        WHERE t.id_user = :id_user {depois_na_timeline}
+        ORDER BY t.date_time DESC, t.id_post DESC
+        LIMIT :limite
+    )
+    UNION ALL
+    SELECT p.date_time, p.id_post
+    FROM "Seguidores" s
+    CROSS JOIN "Usuarios" u ON u.id_user = s.id_seguido AND u.fanout_leitura
+    CROSS JOIN "Postagens" p ON p.id_user = s.id_seguido {depois_no_post} AND p.date_time >= coalesce((
+        SELECT r.date_time FROM "Postagens" r
+        WHERE r.id_user = s.id_seguido {depois_no_corte}
+        ORDER BY r.date_time DESC, r.id_post DESC
+        LIMIT 1 OFFSET :limite - 1
+    ), '')
+    WHERE s.id_seguidor = :id_user
+'''
+
+
+# Função que coloca um post recém-criado nas timelines (deve rodar na mesma transação da criação do post)
+async def distribuir_post(session, id_post):
+    await session.execute(DISTRIBUIR_POST, {'id_post': id_post})
+
+
+# Função que coloca vários posts recém-criados nas timelines com um único INSERT ... SELECT (mesma transação da criação)
+async def distribuir_posts(session, ids_posts):
+    if ids_posts:
+        await session.execute(DISTRIBUIR_POSTS, {'ids': json.dumps(ids_posts)})
+
+
+# Função que tira um post de todas as timelines (post deletado)
+async def remover_post(session, id_post):
+    await session.execute(delete(EntradaTimeline).where(EntradaTimeline.id_post==id_post).execution_options(synchronize_session=False))
+
+
+# Função para seguir um usuário
+async def seguir(session, id_seguidor, id_seguido):
+    if id_seguidor == id_seguido:
+        raise HTTPException(status_code=400, detail='Você não pode seguir a si mesmo')
+    seguido = (await session.execute(select(Usuario.seguidores, Usuario.fanout_leitura).where(Usuario.id_user==id_seguido))).first()
+    if not seguido:
+        raise HTTPException(status_code=400, detail='Usuário não encontrado')
+    resultado = await session.execute(insert(Seguidor).values(id_seguidor=id_seguidor, id_seguido=id_seguido).on_conflict_do_nothing())
+    if resultado.rowcount == 0:
+        raise HTTPException(status_code=400, detail='Você já segue esse usuário')
+    usuarios = Usuario.__table__
+    await session.execute(update(usuarios).where(usuarios.c.id_user==id_seguido).values( # chegando no limiar, passa para o fan-out na leitura de vez
+        seguidores=usuarios.c.seguidores + 1,
+        fanout_leitura=or_(usuarios.c.fanout_leitura, usuarios.c.seguidores + 1 >= FANOUT_LIMIAR),
+    ))
+    if not (seguido.fanout_leitura or seguido.seguidores + 1 >= FANOUT_LIMIAR): # trazendo os posts recentes de quem foi seguido para o feed
+        recentes = (
+            select(Postagem.id_post, Postagem.date_time)
+            .where(Postagem.id_user==id_seguido, Postagem.date_time.is_not(None))
+            .order_by(Postagem.date_time.desc(), Postagem.id_post.desc())
+            .limit(TIMELINE_BACKFILL)
+            .subquery()
+        )
+        await session.execute(
+            insert(EntradaTimeline)
+            .prefix_with('OR IGNORE') # o post pode já estar no feed
+            .from_select(['id_user', 'id_post', 'date_time'], select(literal(id_seguidor), recentes.c.id_post, recentes.c.date_time))
+        )
+    await session.commit()
+
+
+# Função para deixar de seguir um usuário
+async def deixar_de_seguir(session, id_seguidor, id_seguido):
+    resultado = await session.execute(delete(Seguidor).where(Seguidor.id_seguidor==id_seguidor, Seguidor.id_seguido==id_seguido).execution_options(synchronize_session=False))
+    if resultado.rowcount == 0:
+        raise HTTPException(status_code=400, detail='Você não segue esse usuário')
+    await session.execute(update(Usuario.__table__).where(Usuario.__table__.c.id_user==id_seguido).values(seguidores=Usuario.__table__.c.seguidores - 1))
+    await session.execute( # tirando do feed os posts de quem deixou de ser seguido
+        delete(EntradaTimeline).where(
+            EntradaTimeline.id_user==id_seguidor,
+            EntradaTimeline.id_post.in_(select(Postagem.id_post).where(Postagem.id_user==id_seguido)),
+        ).execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+# Função que lê uma página do feed do usuário, da mais nova para a mais antiga, em uma única consulta (LER_FEED)
+# Retorna a lista de [data crua, id_post] da página (com um a mais para saber se existe próxima página)
+async def ler_feed(session, id_user, posicao, limit):
+    parametros = {'id_user': id_user, 'limite': limit + 1}
+    sql = LER_FEED.format(
+        depois_na_timeline='AND (t.date_time, t.id_post) < (:data, :id_post)' if posicao else '',
+        depois_no_post='AND (p.date_time, p.id_post) < (:data, :id_post)' if posicao else '',
+        depois_no_corte='AND (r.date_time, r.id_post) < (:data, :id_post)' if posicao else '',
+    )
+    if posicao:
+        parametros['data'], parametros['id_post'] = posicao
+    entradas = [tuple(linha) for linha in await session.execute(text(sql), parametros)]
+
+    vistos = set()
+    pagina = []
+    for date_time, id_post in sorted(entradas, reverse=True):
+        if id_post not in vistos and date_time is not None: # o mesmo post pode vir das duas partes
+            vistos.add(id_post)
+            pagina.append((date_time, id_post))
+        if len(pagina) > limit:
+            break
+    return pagina